@@ -3,7 +3,7 @@
 #  TICC-DASH Installer
 #  - Installs into /opt/ticc-dash
 #  - Uses current user
-#  - Creates venv and installs Flask + Gunicorn
+#  - Creates venv and installs Flask + Gunicorn + NumPy (+ uvicorn for asgi)
 #  - Downloads ticc-dash.py + logo from GitHub
 #  - Sets up and enables a systemd service
 # ==========================================
@@ -16,12 +16,18 @@ VENV_DIR="$APP_DIR/venv"
 SERVICE_NAME="ticc-dash.service"
 SERVICE_FILE="/etc/systemd/system/$SERVICE_NAME"
 SUDOERS_FILE="/etc/sudoers.d/ticc-dash"
+# Each live dashboard holds one /stream connection (one gunicorn thread)
+GUNICORN_THREADS="${GUNICORN_THREADS:-256}"
+# gunicorn (threaded workers) or asgi (one asyncio process, no thread per viewer)
+SERVER_MODE="${SERVER_MODE:-gunicorn}"
 
 # Sources in repo
 REPO_RAW_PY="https://raw.githubusercontent.com/arunderwood/ticc-dash/main/ticc-dash.py"
 REPO_RAW_LOGO="https://raw.githubusercontent.com/arunderwood/ticc-dash/main/static/img/ticc-dash-logo.png"
 
 USER_NAME="$(whoami)"
+# Group owning chronyd's socket directory (Debian: _chrony)
+CHRONY_GROUP="$(stat -c %G /run/chrony 2>/dev/null || echo _chrony)"
 
 log()  { printf "\n\033[1;34m%s\033[0m\n" "$*"; }
 ok()   { printf "\033[1;32m%s\033[0m\n" "$*"; }
@@ -62,7 +68,12 @@ log "🐍 Setting up Python virtual environment..."
 if [ ! -d "$VENV_DIR" ]; then
   run "python3 -m venv '$VENV_DIR'"
 fi
-run "source '$VENV_DIR/bin/activate' && pip install --upgrade pip && pip install flask gunicorn && deactivate"
+PIP_PACKAGES="flask gunicorn numpy orjson msgpack"
+if [ "$SERVER_MODE" = "asgi" ]; then
+  # The built-in asyncio server is only a fallback for development.
+  PIP_PACKAGES="$PIP_PACKAGES uvicorn"
+fi
+run "source '$VENV_DIR/bin/activate' && pip install --upgrade pip && pip install $PIP_PACKAGES && deactivate"
 ok "✅ Virtual environment ready."
 
 # 5) App + Logo
@@ -90,6 +101,11 @@ fi
 
 # 6) systemd service
 log "⚙️  Creating systemd service..."
+if [ "$SERVER_MODE" = "asgi" ]; then
+  EXEC_START="$VENV_DIR/bin/python $APP_DIR/ticc-dash.py --asgi --host 0.0.0.0 --port 5000"
+else
+  EXEC_START="$VENV_DIR/bin/gunicorn --bind 0.0.0.0:5000 --worker-class gthread --threads $GUNICORN_THREADS ticc-dash:app"
+fi
 run "sudo bash -c 'cat > \"$SERVICE_FILE\" <<EOF
 [Unit]
 Description=$APP_NAME - Time Information of Chrony Clients Dashboard
@@ -98,9 +114,13 @@ After=network.target
 [Service]
 User=$USER_NAME
 WorkingDirectory=$APP_DIR
-ExecStart=$VENV_DIR/bin/gunicorn --bind 0.0.0.0:5000 ticc-dash:app
+SupplementaryGroups=$CHRONY_GROUP
+RuntimeDirectory=ticc-dash
+ExecStart=$EXEC_START
 Restart=always
 Environment=PYTHONUNBUFFERED=1
+Environment=TICC_DASH_SOCKET_DIR=/run/ticc-dash
+Environment=TICC_DASH_HISTORY_DIR=$APP_DIR/history
 
 [Install]
 WantedBy=multi-user.target
@@ -0,0 +1,42 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+# No resolver threads or history files in tests.
+os.environ.setdefault("TICC_DASH_RESOLVE_WORKERS", "0")
+os.environ.setdefault("TICC_DASH_HISTORY_SPAN", "0")
+
+
+def _load():
+    # ticc-dash.py is not an importable name; load it from its path.
+    spec = importlib.util.spec_from_file_location(
+        "ticc_dash", os.path.join(ROOT, "ticc-dash.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["ticc_dash"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+td = _load()
+
+
+@pytest.fixture
+def publish(monkeypatch):
+    """Swap in a collector that is fed by hand: ``publish(records)`` collects
+    ``records`` and returns the resulting snapshot."""
+    current = [[]]
+    # Background collections (the ASGI app starts one) see the same table.
+    collector = td.Collector(lambda: (current[-1], ""), 3600)
+    monkeypatch.setattr(td, "collector", collector)
+
+    def publish(records):
+        current.append(records)
+        return collector.collect()
+
+    return publish
@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import td
+
+
+def records(n):
+    return [td.ClientRecord(f"10.0.0.{i}", ntp_hits=i) for i in range(n)]
+
+
+async def read_response(reader, method="GET"):
+    """``(status, headers, body)`` of one response, framed as a client would."""
+    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    if method == "HEAD" or status in (204, 304) or status < 200:
+        return status, headers, b""
+    if "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while True:
+            size = int(await reader.readuntil(b"\r\n"), 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                break
+            body += chunk[:-2]
+    else:
+        body = await reader.read()
+    return status, headers, body
+
+
+def request(path, method="GET", version="HTTP/1.1", **headers):
+    lines = [f"{method} {path} {version}", "Host: test"]
+    lines += [f"{k.replace('_', '-')}: {v}" for k, v in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def serve(test):
+    async def main():
+        server = await asyncio.start_server(td._serve_connection, "127.0.0.1", 0)
+        host, port = server.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            await test(reader, writer)
+        finally:
+            writer.close()
+            server.close()
+            td.collector.stop_async()
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def table(publish):
+    return publish(records(50))
+
+
+def test_not_modified_keeps_connection_usable(table):
+    async def test(reader, writer):
+        writer.write(request("/data"))
+        status, headers, body = await read_response(reader)
+        assert status == 200
+        assert json.loads(body)["count"] == 50
+        etag = headers["etag"]
+
+        writer.write(request("/data", If_None_Match=etag))
+        status, headers, body = await read_response(reader)
+        assert status == 304
+        assert "transfer-encoding" not in headers
+
+        # No stray bytes after the 304: the next response parses cleanly.
+        writer.write(request("/data?format=columns"))
+        status, _, body = await read_response(reader)
+        assert status == 200
+        assert json.loads(body)["layout"] == "columns"
+
+    serve(test)
+
+
+def test_head_has_no_body(table):
+    async def test(reader, writer):
+        writer.write(request("/export.csv", method="HEAD"))
+        status, headers, _ = await read_response(reader, "HEAD")
+        assert status == 200
+        assert "transfer-encoding" not in headers
+        writer.write(request("/data"))
+        status, _, body = await read_response(reader)
+        assert status == 200
+        assert json.loads(body)["count"] == 50
+
+    serve(test)
+
+
+def test_streamed_response_is_chunked(table):
+    async def test(reader, writer):
+        writer.write(request("/export.csv"))
+        status, headers, body = await read_response(reader)
+        assert status == 200
+        assert headers["transfer-encoding"] == "chunked"
+        assert len(body.decode().splitlines()) == 51
+        writer.write(request("/data"))
+        assert (await read_response(reader))[0] == 200
+
+    serve(test)
+
+
+def test_http10_closes(table):
+    async def test(reader, writer):
+        writer.write(request("/export.csv", version="HTTP/1.0"))
+        status, headers, body = await read_response(reader)
+        assert status == 200
+        assert headers["connection"] == "close"
+        assert body.startswith(b"addr,")
+        assert await reader.read() == b""
+
+    serve(test)
+
+
+def test_connection_close(table):
+    async def test(reader, writer):
+        writer.write(request("/data", Connection="close"))
+        status, headers, _ = await read_response(reader)
+        assert status == 200
+        assert headers["connection"] == "close"
+        assert await reader.read() == b""
+
+    serve(test)
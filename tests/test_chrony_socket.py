@@ -0,0 +1,118 @@
+import struct
+
+import pytest
+from fake_chronyd import STT_INVALID, FakeChronyd, make_clients
+
+from conftest import td
+
+
+@pytest.fixture
+def sock_path(tmp_path):
+    return str(tmp_path / "chronyd.sock")
+
+
+def _client(path, timeout=1.0):
+    return td.ChronyCmdClient(path=path, timeout=timeout)
+
+
+def test_clients_pages_through_table(sock_path):
+    table = make_clients(21)
+    with FakeChronyd(path=sock_path, clients=table) as fake:
+        client = _client(sock_path)
+        try:
+            records = client.clients()
+        finally:
+            client.close()
+    # 21 clients at 8 per reply: three pages.
+    assert fake.requests == 3
+    assert [r.addr for r in records] == [str(c[0]) for c in table]
+    addr, ntp, drops, interval, last = table[4]
+    rec = records[4]
+    assert ":" in rec.addr
+    assert (rec.ntp_hits, rec.ntp_drops, rec.ntp_interval) == (ntp, drops, interval)
+    assert rec.last_ntp == last
+    assert rec.last_cmd is None
+
+
+def test_clients_full_last_page(sock_path):
+    with FakeChronyd(path=sock_path, clients=make_clients(16)) as fake:
+        client = _client(sock_path)
+        try:
+            records = client.clients()
+        finally:
+            client.close()
+    assert len(records) == 16
+    # The second page ends the table although it is full.
+    assert fake.requests == 2
+
+
+def test_clients_empty_table(sock_path):
+    with FakeChronyd(path=sock_path):
+        client = _client(sock_path)
+        try:
+            assert client.clients() == []
+        finally:
+            client.close()
+
+
+class FailingChronyd(FakeChronyd):
+    def __init__(self, status, **kwargs):
+        super().__init__(**kwargs)
+        self.status = status
+
+    def reply(self, packet):
+        out = bytearray(super().reply(packet))
+        struct.pack_into("!H", out, 8, self.status)
+        return bytes(out)
+
+
+def test_clients_error_status(sock_path):
+    with FailingChronyd(STT_INVALID, path=sock_path, clients=make_clients(3)):
+        client = _client(sock_path)
+        with pytest.raises(td.ChronyError, match="chronyd: invalid command"):
+            client.clients()
+        # The socket is dropped so that the next call starts over.
+        assert client._sock is None
+
+
+def test_clients_unknown_status(sock_path):
+    with FailingChronyd(99, path=sock_path, clients=make_clients(3)):
+        client = _client(sock_path)
+        with pytest.raises(td.ChronyError, match="status 99"):
+            client.clients()
+
+
+class SilentChronyd(FakeChronyd):
+    def reply(self, packet):
+        super().reply(packet)
+        return None
+
+
+def test_clients_timeout(sock_path):
+    with SilentChronyd(path=sock_path, clients=make_clients(3)) as fake:
+        client = _client(sock_path, timeout=0.2)
+        with pytest.raises(td.ChronyError, match="no reply"):
+            client.clients()
+    # The Unix socket is not retried.
+    assert fake.requests == 1
+    assert client._sock is None
+
+
+def test_clients_udp_retries(tmp_path):
+    with SilentChronyd(clients=make_clients(3)) as fake:
+        host, port = fake.address
+        client = td.ChronyCmdClient(host=host, port=port, timeout=0.1)
+        with pytest.raises(td.ChronyError, match="no reply"):
+            client.clients()
+    assert fake.requests == 3
+
+
+def test_aclients_pages_through_table(sock_path):
+    table = make_clients(21)
+    with FakeChronyd(path=sock_path, clients=table):
+        client = _client(sock_path)
+        try:
+            records = td.asyncio.run(client.aclients())
+        finally:
+            client.close()
+    assert [r.addr for r in records] == [str(c[0]) for c in table]
@@ -0,0 +1,48 @@
+import asyncio
+
+from conftest import td
+
+
+def rec(addr):
+    return td.ClientRecord(addr, ntp_hits=1)
+
+
+def test_get_after_stop_async(publish):
+    async def main():
+        td.collector.start_async()
+        await td.collector.aget()
+        td.collector.stop_async()
+
+    asyncio.run(main())
+    publish([rec("10.0.0.1")])
+    # A Flask route still running after lifespan shutdown falls back to a thread.
+    snap = td.collector.get()
+    assert [r.addr for r in snap.records] == ["10.0.0.1"]
+    assert td.collector._thread.is_alive()
+
+
+def test_start_once(publish):
+    td.collector.start()
+    thread = td.collector._thread
+    td.collector.start()
+    assert td.collector._thread is thread
+
+
+def test_aget_timeout(publish):
+    async def main():
+        release = asyncio.Event()
+
+        async def afetch():
+            await release.wait()
+            return [rec("10.0.0.1")], ""
+
+        td.collector._afetch = afetch
+        # The collection in flight is not cancelled; the caller gets what is there.
+        snap = await td.collector.aget(timeout=0.05)
+        assert snap.version == 0
+        release.set()
+        snap = await td.collector.aget()
+        td.collector.stop_async()
+        return snap
+
+    assert [r.addr for r in asyncio.run(main()).records] == ["10.0.0.1"]
@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import pytest
+
+from conftest import td
+
+
+def records(n, drops=0):
+    return [
+        td.ClientRecord(f"10.0.{i // 256}.{i % 256}", ntp_hits=i, ntp_drops=drops)
+        for i in range(n)
+    ]
+
+
+def respond(snap, since=None, view=None, fmt="json", encoding="gzip"):
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    with td.app.test_request_context(headers=headers):
+        return td._data_response(snap, since, view, fmt)
+
+
+def test_gzip_splice_decodes(publish):
+    snap = publish(records(300))
+    resp = respond(snap)
+    assert resp.headers["Content-Encoding"] == "gzip"
+    payload = json.loads(gzip.decompress(resp.get_data()))
+    assert "local_time" in payload
+    del payload["local_time"]
+    assert isinstance(payload.pop("server_time"), float)
+    assert payload == td._snapshot_payload(snap)
+    # A second request reuses the cached deflate stream.
+    assert json.loads(gzip.decompress(respond(snap).get_data()))["count"] == 300
+
+
+def test_gzip_matches_identity(publish):
+    snap = publish(records(300))
+    plain = json.loads(respond(snap, encoding=None).get_data())
+    spliced = json.loads(gzip.decompress(respond(snap).get_data()))
+    for payload in (plain, spliced):
+        payload.pop("local_time")
+        payload.pop("server_time")
+    assert plain == spliced
+
+
+def test_gzip_delta_and_columns(publish):
+    first = publish(records(300))
+    second = publish(records(300, drops=1))
+    payload = json.loads(
+        gzip.decompress(respond(second, first.tag, fmt="columns").get_data())
+    )
+    assert payload["delta"] is True
+    assert payload["layout"] == "columns"
+    assert payload["changed"]["Drop"] == ["1"] * 300
+
+
+def test_small_body_not_compressed(publish):
+    snap = publish(records(1))
+    resp = respond(snap)
+    assert "Content-Encoding" not in resp.headers
+    assert json.loads(resp.get_data())["clients_parsed"][0]["addr"] == "10.0.0.0"
+
+
+def test_msgpack_live_prefix(publish):
+    msgpack = pytest.importorskip("msgpack")
+    snap = publish(records(300))
+    for encoding in (None, "gzip"):
+        data = respond(snap, fmt="msgpack", encoding=encoding).get_data()
+        if encoding:
+            data = gzip.decompress(data)
+        payload = msgpack.unpackb(data)
+        assert isinstance(payload.pop("local_time"), str)
+        assert isinstance(payload.pop("server_time"), float)
+        assert payload["layout"] == "columns"
+        assert payload["count"] == 300
+        assert payload["clients_parsed"]["addr"][:2] == ["10.0.0.0", "10.0.0.1"]
+
+
+def test_made_up_since_adds_no_cache_entries(publish):
+    snap = publish(records(300))
+    respond(snap)
+    before = len(snap.cache) + len(snap.views)
+    for i in range(20):
+        respond(snap, since=f"bogus.{i}")
+    assert len(snap.cache) + len(snap.views) == before
@@ -0,0 +1,91 @@
+from conftest import td
+
+
+def rec(addr, ntp=1, drops=0):
+    return td.ClientRecord(addr, ntp_hits=ntp, ntp_drops=drops)
+
+
+def test_delta_added_removed_changed():
+    old = td.Snapshot(1, "e.1", 0.0, [rec("10.0.0.1"), rec("10.0.0.2")], "")
+    new = td.Snapshot(
+        2, "e.2", 0.0, [rec("10.0.0.1"), rec("10.0.0.2", 5, 2), rec("10.0.0.3")], ""
+    )
+    added, removed, changed = td.snapshot_delta(old, new)
+    assert [row["addr"] for row in added] == ["10.0.0.3"]
+    assert removed == []
+    assert changed == [rec("10.0.0.2", 5, 2).to_row()]
+
+    added, removed, changed = td.snapshot_delta(new, old)
+    assert added == []
+    assert removed == ["10.0.0.3"]
+    assert [row["Drop"] for row in changed] == ["0"]
+
+
+def test_delta_unchanged():
+    old = td.Snapshot(1, "e.1", 0.0, [rec("10.0.0.1")], "")
+    new = td.Snapshot(2, "e.2", 0.0, [rec("10.0.0.1")], "")
+    assert td.snapshot_delta(old, new) == ([], [], [])
+
+
+def test_delta_cached_per_base():
+    old = td.Snapshot(1, "e.1", 0.0, [rec("10.0.0.1")], "")
+    new = td.Snapshot(2, "e.2", 0.0, [rec("10.0.0.2")], "")
+    assert td.snapshot_delta(old, new) is td.snapshot_delta(old, new)
+
+
+def test_payload_delta_since_known_version(publish):
+    first = publish([rec("10.0.0.1"), rec("10.0.0.2")])
+    second = publish([rec("10.0.0.1", 2), rec("10.0.0.3")])
+    payload = td._snapshot_payload(second, first.tag)
+    assert payload["delta"] is True
+    assert payload["since"] == first.tag
+    assert [row["addr"] for row in payload["added"]] == ["10.0.0.3"]
+    assert payload["removed"] == ["10.0.0.2"]
+    assert [row["addr"] for row in payload["changed"]] == ["10.0.0.1"]
+    assert "clients_parsed" not in payload
+
+
+def test_payload_full_table_for_unknown_version(publish):
+    snap = publish([rec("10.0.0.1")])
+    payload = td._snapshot_payload(snap, "no.such")
+    assert "delta" not in payload
+    assert payload["clients_parsed"] == [rec("10.0.0.1").to_row()]
+
+
+def aged(addr, ntp, last_ntp):
+    return td.ClientRecord(addr, ntp_hits=ntp, last_ntp=last_ntp)
+
+
+def test_growing_ages_keep_the_version(publish, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(td.time, "time", lambda: now[0])
+    first = publish([aged("10.0.0.1", 5, 30), aged("10.0.0.2", 7, None)])
+    assert first.records[0].seen_ntp == 970
+    assert first.records[1].seen_ntp is None
+    # chronyd reports one second older (and rounds) on the next collections.
+    for t, age in ((1001.2, 31), (1001.9, 31), (1003.6, 34)):
+        now[0] = t
+        assert publish([aged("10.0.0.1", 5, age), aged("10.0.0.2", 7, None)]) is first
+    # A new hit moves the time and makes a new version.
+    now[0] = 1010.0
+    second = publish([aged("10.0.0.1", 6, 2), aged("10.0.0.2", 7, None)])
+    assert second is not first
+    assert second.records[0].seen_ntp == 1008
+    assert td._snapshot_payload(second, first.tag)["changed"] == [
+        second.records[0].to_row()
+    ]
+
+
+def test_seen_from_fake_chronyd(tmp_path, publish, monkeypatch):
+    from fake_chronyd import FakeChronyd, make_clients
+
+    path = str(tmp_path / "chronyd.sock")
+    with FakeChronyd(path=path, clients=make_clients(20)) as fake:
+        client = td.ChronyCmdClient(path=path)
+        try:
+            first = publish(client.clients())
+            # Ages reported two seconds later are two seconds larger.
+            fake.started -= 2
+            assert publish(client.clients()) is first
+        finally:
+            client.close()
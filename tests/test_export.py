@@ -0,0 +1,96 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from conftest import td
+
+ADDRS = (
+    "10.0.0.1",
+    "10.0.0.255",
+    "10.0.1.0",
+    "10.1.0.1",
+    "192.0.2.1",
+    "2001:db8::1",
+    "2001:db8:0:1::1",
+    "2001:db9::1",
+    "ID#0000000001",
+)
+
+
+def table():
+    return [
+        td.ClientRecord(addr, ntp_hits=10, ntp_drops=i * 4)
+        for i, addr in enumerate(ADDRS)
+    ]
+
+
+def kept(args):
+    keep = td._export_filter(args)
+    return [rec.addr for rec in table() if keep is None or keep(rec)]
+
+
+@pytest.mark.parametrize(
+    "cidr, expected",
+    [
+        ("10.0.0.0/24", ["10.0.0.1", "10.0.0.255"]),
+        ("10.0.0.0/16", ["10.0.0.1", "10.0.0.255", "10.0.1.0"]),
+        # Host bits are ignored, like ipaddress.ip_network(strict=False).
+        ("10.0.0.77/23", ["10.0.0.1", "10.0.0.255", "10.0.1.0"]),
+        ("192.0.2.1/32", ["192.0.2.1"]),
+        ("0.0.0.0/0", ADDRS[:5]),
+        ("2001:db8::/32", ["2001:db8::1", "2001:db8:0:1::1"]),
+        ("2001:DB8::/64", ["2001:db8::1"]),
+        ("::/0", ADDRS[5:8]),
+    ],
+)
+def test_filter_cidr(cidr, expected):
+    assert kept({"addr": cidr}) == list(expected)
+
+
+def test_filter_cidr_invalid():
+    with pytest.raises(ValueError):
+        td._export_filter({"addr": "10.0.0.0/33"})
+    with pytest.raises(ValueError):
+        td._export_filter({"addr": "example/8"})
+
+
+def test_filter_prefix():
+    assert kept({"addr": "10.0.0."}) == ["10.0.0.1", "10.0.0.255"]
+    assert kept({"addr": " 2001:DB8"}) == ["2001:db8::1", "2001:db8:0:1::1"]
+
+
+def test_filter_severity_and_drops():
+    # Drops are 0, 4, 8, 12, ... in table order: ok, warning, warning, critical.
+    assert kept({"severity": "ok"}) == ["10.0.0.1"]
+    assert kept({"severity": "warning,critical"}) == list(ADDRS[1:])
+    assert kept({"min_drops": "20"}) == list(ADDRS[5:])
+    assert kept({"addr": "10.0.0.0/8", "severity": "critical"}) == ["10.1.0.1"]
+    with pytest.raises(ValueError):
+        td._export_filter({"severity": "bad"})
+    with pytest.raises(ValueError):
+        td._export_filter({"min_drops": "many"})
+
+
+def test_no_filter():
+    assert td._export_filter({}) is None
+    assert td._export_filter({"addr": " ", "severity": ""}) is None
+
+
+def test_export_csv(monkeypatch):
+    monkeypatch.setattr(td, "EXPORT_CHUNK", 2)
+    body = b"".join(td._export_csv(table(), td._export_filter({"addr": "10.0.0.0/16"})))
+    rows = list(csv.DictReader(io.StringIO(body.decode())))
+    assert [row["addr"] for row in rows] == ["10.0.0.1", "10.0.0.255", "10.0.1.0"]
+    assert rows[2]["severity"] == "warning"
+    assert rows[0]["ntp_interval"] == ""
+
+
+def test_export_ndjson_gzip():
+    chunks = td._export_ndjson(table(), td._export_filter({"min_drops": "28"}), False)
+    body = gzip.decompress(b"".join(td._gzip_chunks(chunks)))
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert [row["addr"] for row in rows] == ["2001:db9::1", "ID#0000000001"]
+    assert rows[0]["ntp_drops"] == 28
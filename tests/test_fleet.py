@@ -0,0 +1,167 @@
+import sys
+import threading
+
+import pytest
+
+from conftest import td
+
+
+def rec(addr, ntp=0, drops=0, interval=td.INVALID_RATE, last=None, cmd=0):
+    return td.ClientRecord(
+        addr,
+        ntp_hits=ntp,
+        ntp_drops=drops,
+        ntp_interval=interval,
+        last_ntp=last,
+        cmd_hits=cmd,
+    )
+
+
+def test_merge_records():
+    merged = td.merge_records(
+        [
+            ("a", [rec("10.0.0.1", 10, 1, 6, 30, 2), rec("10.0.0.2", 5)]),
+            ("b", [rec("10.0.0.1", 4, 2, 4, 50), rec("10.0.0.3", 1, last=7)]),
+            ("c", [rec("10.0.0.1", 1, 0, td.INVALID_RATE, None, 1)]),
+        ]
+    )
+    by_addr = {r.addr: r for r in merged}
+    both = by_addr["10.0.0.1"]
+    assert (both.ntp_hits, both.ntp_drops, both.cmd_hits) == (15, 3, 3)
+    # Shortest interval and most recent hit; unknown values do not count.
+    assert both.ntp_interval == 4
+    assert both.last_ntp == 30
+    assert both.servers == ("a", "b", "c")
+    assert by_addr["10.0.0.2"].servers == ("a",)
+    assert by_addr["10.0.0.3"].last_ntp == 7
+    assert by_addr["10.0.0.2"].ntp_interval == td.INVALID_RATE
+
+
+def test_merge_does_not_modify_inputs():
+    first = rec("10.0.0.1", 10)
+    td.merge_records([("a", [first]), ("b", [rec("10.0.0.1", 5)])])
+    assert first.ntp_hits == 10
+    assert first.servers == ()
+
+
+class Slow:
+    """A fetch that blocks until released and counts its calls."""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        assert self.release.wait(10)
+        return self.records
+
+
+@pytest.fixture
+def slow():
+    fetch = Slow([rec("10.0.0.9", 3)])
+    yield fetch
+    fetch.release.set()
+
+
+def test_collect_merges_and_sorts():
+    fleet = td.Fleet(
+        [
+            td.Endpoint("a", lambda: [rec("10.0.0.2", 1)], 1.0),
+            td.Endpoint("b", lambda: [rec("10.0.0.1", 1), rec("10.0.0.2", 1)], 1.0),
+        ]
+    )
+    records, err = fleet.collect()
+    assert err == ""
+    assert [(r.addr, r.ntp_hits) for r in records] == [("10.0.0.1", 1), ("10.0.0.2", 2)]
+    assert [s["stale"] for s in fleet.status()] == [False, False]
+
+
+def test_collect_timeout_keeps_overrunning_fetch(slow):
+    fast = td.Endpoint("fast", lambda: [rec("10.0.0.1", 1)], 1.0)
+    hung = td.Endpoint("hung", slow, 0.1)
+    fleet = td.Fleet([fast, hung])
+
+    records, err = fleet.collect()
+    assert [r.addr for r in records] == ["10.0.0.1"]
+    assert err == "hung: timed out after 0.1s"
+    assert hung.status(0)["stale"]
+
+    # Still running: waited for again, not started a second time.
+    records, err = fleet.collect()
+    assert slow.calls == 1
+    assert "timed out" in err
+
+    # Its late result is used by the next refresh without another fetch.
+    slow.release.set()
+    hung.future.result(5)
+    records, err = fleet.collect()
+    assert slow.calls == 1
+    assert err == ""
+    assert [r.addr for r in records] == ["10.0.0.1", "10.0.0.9"]
+    assert not hung.status(0)["stale"]
+
+    # Done, so the refresh after that fetches again.
+    fleet.collect()
+    assert slow.calls == 2
+
+
+def test_collect_expires_failed_endpoint():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) > 1:
+            raise OSError("connection refused")
+        return [rec("10.0.0.5", 2)]
+
+    ep = td.Endpoint("flaky", flaky, 1.0)
+    fleet = td.Fleet([ep], expire=60)
+    assert [r.addr for r in fleet.collect()[0]] == ["10.0.0.5"]
+
+    # A failure keeps the last table, marked stale, until it expires.
+    records, err = fleet.collect()
+    assert [r.addr for r in records] == ["10.0.0.5"]
+    assert err == "flaky: connection refused"
+    status = fleet.status()[0]
+    assert status["stale"] and status["count"] == 1
+
+    ep.ok_at -= 61
+    records, err = fleet.collect()
+    assert records == []
+    assert err == "flaky: connection refused"
+
+
+def test_endpoint_never_fetched_is_stale():
+    assert td.Endpoint("new", list, 1.0).status(0)["stale"]
+
+
+def test_unique_names():
+    with pytest.raises(ValueError):
+        td.Fleet([td.Endpoint("a", list, 1.0), td.Endpoint("a", list, 1.0)])
+
+
+def test_command_source():
+    ep = td.Endpoint.from_config(
+        {
+            "name": "remote",
+            "source": "command",
+            "command": [
+                sys.executable,
+                "-c",
+                "print('192.0.2.1,5,1,6,-,3,0,0,-,-')",
+            ],
+        }
+    )
+    fleet = td.Fleet([ep])
+    records, err = fleet.collect()
+    assert err == ""
+    assert [(r.addr, r.ntp_hits, r.servers) for r in records] == [
+        ("192.0.2.1", 5, ("remote",))
+    ]
+
+
+def test_unknown_source():
+    with pytest.raises(ValueError, match="unknown source"):
+        td.Endpoint.from_config({"name": "x", "source": "ntpq"})
@@ -0,0 +1,167 @@
+import pytest
+
+from conftest import td
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(td.time, "time", lambda: now[0])
+    return now
+
+
+def table(ntp, drops, addrs=("10.0.0.1",)):
+    return [td.ClientRecord(a, ntp_hits=ntp, ntp_drops=drops) for a in addrs]
+
+
+def sample(history, clock, t, ntp, drops, addrs=("10.0.0.1",)):
+    clock[0] = t
+    records = table(ntp, drops, addrs)
+    history.annotate(records)
+    return records
+
+
+def test_samples_once_per_step(clock):
+    h = td.History(step=10, span=50, window=30)
+    sample(h, clock, 1000, 1, 0)
+    sample(h, clock, 1005, 2, 0)
+    sample(h, clock, 1010, 3, 0)
+    assert h.series("10.0.0.1")["samples"] == [[1000.0, 1, 0], [1010.0, 3, 0]]
+
+
+def test_ring_keeps_last_slots(clock):
+    h = td.History(step=10, span=50, window=30)
+    for i in range(8):
+        sample(h, clock, 1000 + 10 * i, i, 0)
+    samples = h.series("10.0.0.1")["samples"]
+    assert h.slots == 5
+    assert [s[1] for s in samples] == [3, 4, 5, 6, 7]
+    assert samples[0][0] == 1030.0
+
+
+def test_rates_over_window(clock):
+    h = td.History(step=10, span=100, window=30)
+    for i in range(6):
+        sample(h, clock, 1000 + 10 * i, 100 + 6 * i, 2 * i)
+    series = h.series("10.0.0.1")
+    # Baseline is the sample 30 s before the newest one.
+    assert series["ntp_rate"] == pytest.approx(18 / 30)
+    assert series["drop_rate"] == pytest.approx(6 / 30)
+    assert h.series("10.0.0.1", 50)["ntp_rate"] == pytest.approx(30 / 50)
+    assert h.series("10.0.0.9") is None
+
+
+def test_severity_from_recent_drops(clock):
+    h = td.History(step=10, span=100, window=30)
+    sample(h, clock, 1000, 10, 500)
+    for i in range(1, 4):
+        sample(h, clock, 1000 + 10 * i, 10, 500)
+    # 500 drops in total, none within the window: OK.
+    records = sample(h, clock, 1040, 10, 500)
+    assert (records[0].recent_drops, records[0].severity) == (0, 0)
+    records = sample(h, clock, 1050, 10, 503)
+    assert (records[0].recent_drops, records[0].severity) == (3, 1)
+    records = sample(h, clock, 1060, 10, 520)
+    assert (records[0].recent_drops, records[0].severity) == (20, 2)
+
+
+def test_counter_reset(clock):
+    h = td.History(step=10, span=100, window=30)
+    sample(h, clock, 1000, 50, 40)
+    # chronyd restarted: counters start again from zero.
+    records = sample(h, clock, 1010, 2, 1)
+    assert records[0].recent_drops == 1
+    assert records[0].severity == 1
+    assert h.series("10.0.0.1")["ntp_rate"] == 0
+
+
+def test_window_gap_has_no_baseline(clock):
+    h = td.History(step=10, span=100, window=30)
+    sample(h, clock, 1000, 10, 5)
+    # Nothing older within the window: the new sample is the baseline.
+    records = sample(h, clock, 1100, 20, 7)
+    assert h.series("10.0.0.1")["ntp_rate"] is None
+    assert records[0].recent_drops == 0
+    records = sample(h, clock, 1110, 30, 9)
+    assert records[0].recent_drops == 2
+    assert h.series("10.0.0.1")["ntp_rate"] == pytest.approx(1.0)
+
+
+def test_grows_beyond_first_allocation(clock):
+    h = td.History(step=10, span=50, window=30)
+    addrs = [f"10.0.{i // 256}.{i % 256}" for i in range(1500)]
+    sample(h, clock, 1000, 1, 0, addrs)
+    assert len(h.ntp) == 2048
+    assert len(set(h.rows[a] for a in addrs)) == 1500
+    assert h.series(addrs[-1])["samples"] == [[1000.0, 1, 0]]
+
+
+def test_max_clients(clock):
+    h = td.History(step=10, span=50, window=30, max_clients=1024)
+    addrs = [f"10.0.{i // 256}.{i % 256}" for i in range(1100)]
+    records = sample(h, clock, 1000, 1, 12, addrs)
+    assert len(h.ntp) == 1024
+    assert h.series(addrs[-1]) is None
+    # Clients without a row still get a severity from their counters.
+    assert records[-1].recent_drops == 12
+
+
+def test_reclaims_rows_of_departed_clients(clock):
+    h = td.History(step=10, span=50, window=30, max_clients=1024)
+    first = [f"10.0.{i // 256}.{i % 256}" for i in range(1024)]
+    second = [f"10.1.{i // 256}.{i % 256}" for i in range(1024)]
+    sample(h, clock, 1000, 1, 0, first)
+    for i in range(1, h.slots):
+        sample(h, clock, 1000 + 10 * i, 1, 0, ())
+    # The first clients' samples have all left the ring: their rows are reused.
+    sample(h, clock, 1000 + 10 * h.slots, 1, 0, second)
+    assert len(h.ntp) == 1024
+    assert h.series(first[0]) is None
+    assert h.series(second[-1])["samples"][-1][1] == 1
+
+
+def test_reload_from_disk(clock, tmp_path):
+    h = td.History(step=10, span=50, window=30, path=str(tmp_path))
+    addrs = ("10.0.0.1", "2001:db8::1")
+    for i in range(3):
+        sample(h, clock, 1000 + 10 * i, 5 * i, i, addrs)
+    before = h.series("2001:db8::1")
+
+    reloaded = td.History(step=10, span=50, window=30, path=str(tmp_path))
+    assert reloaded.rows == h.rows
+    assert reloaded.head == h.head
+    assert reloaded.series("2001:db8::1") == before
+    # Keeps sampling where it left off.
+    records = sample(reloaded, clock, 1030, 15, 9, addrs)
+    assert records[0].recent_drops == 9
+    assert len(reloaded.series("10.0.0.1")["samples"]) == 4
+
+
+def test_reload_ignores_other_step(clock, tmp_path):
+    h = td.History(step=10, span=50, window=30, path=str(tmp_path))
+    sample(h, clock, 1000, 1, 0)
+    other = td.History(step=20, span=100, window=30, path=str(tmp_path))
+    assert other.rows == {}
+    assert other.head == -1
+
+
+@pytest.mark.parametrize("window", ["nan", "inf", "-inf", "0", "-5", "soon"])
+def test_history_rejects_bad_window(clock, monkeypatch, window):
+    h = td.History(step=10, span=50, window=30)
+    sample(h, clock, 1000, 1, 0)
+    monkeypatch.setattr(td, "history", h)
+    resp = td.app.test_client().get(f"/history?addr=10.0.0.1&window={window}")
+    assert resp.status_code == 400
+    assert "error" in resp.get_json()
+
+
+def test_history_window(clock, monkeypatch):
+    h = td.History(step=10, span=50, window=30)
+    sample(h, clock, 1000, 1, 0)
+    monkeypatch.setattr(td, "history", h)
+    client = td.app.test_client()
+    assert client.get("/history?addr=10.0.0.1&window=60").get_json()["window"] == 60
+    assert client.get("/history?addr=10.0.0.1").get_json()["window"] == 30
+    assert client.get("/history?addr=10.9.9.9").status_code == 404
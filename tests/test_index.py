@@ -0,0 +1,117 @@
+import pytest
+
+from conftest import td
+
+
+def rec(addr, drops=0, seen=None, hostname=None):
+    r = td.ClientRecord(addr, ntp_hits=1, ntp_drops=drops)
+    r.seen_ntp = seen
+    r.hostname = hostname
+    return r
+
+
+@pytest.fixture
+def index():
+    records = [
+        rec("10.0.0.1", drops=0, seen=100, hostname="alpha.example.net"),
+        rec("10.0.0.10", drops=12, seen=300),
+        rec("10.0.0.2", drops=3, seen=None, hostname="beta.10.example.net"),
+        rec("192.0.2.1", drops=12, seen=300),
+        rec("2001:db8::a", drops=3, seen=200, hostname="Gamma.example.org"),
+        rec("ID#0000000001", drops=0, seen=None),
+    ]
+    records.sort(key=lambda r: r.sort_key)
+    return td.SnapshotIndex(records)
+
+
+def addrs(index, positions):
+    return [index.records[i].addr for i in positions]
+
+
+def test_address_order(index):
+    assert addrs(index, index.order("ip_order")) == [
+        "10.0.0.1",
+        "10.0.0.2",
+        "10.0.0.10",
+        "192.0.2.1",
+        "2001:db8::a",
+        "ID#0000000001",
+    ]
+
+
+def test_search_address_and_hostname(index):
+    assert addrs(index, index.search("10.0.0.1")) == ["10.0.0.1", "10.0.0.10"]
+    assert addrs(index, index.search("example.net")) == ["10.0.0.1", "10.0.0.2"]
+    # Hostnames are matched case-insensitively (queries come lowercased).
+    assert addrs(index, index.search("gamma")) == ["2001:db8::a"]
+    assert addrs(index, index.search("db8::")) == ["2001:db8::a"]
+    assert addrs(index, index.search("id#")) == ["ID#0000000001"]
+    assert index.search("nothing") == []
+
+
+def test_search_one_hit_per_record(index):
+    # "10." is in 10.0.0.2's address and again in its hostname.
+    assert addrs(index, index.search("10.")) == ["10.0.0.1", "10.0.0.2", "10.0.0.10"]
+    assert addrs(index, index.search("e")) == [
+        "10.0.0.1",
+        "10.0.0.2",
+        "2001:db8::a",
+    ]
+
+
+def test_search_does_not_span_records(index):
+    found, counts = index.query("net\n10", "ip_order")
+    assert found == []
+    assert counts == {"ok": 0, "warning": 0, "critical": 0}
+    # The last key of one record and the first of the next are never joined.
+    assert index.search("net10") == []
+
+
+def test_sort_tie_breaks_in_address_order(index):
+    assert addrs(index, index.order("drop_desc")) == [
+        "10.0.0.10",
+        "192.0.2.1",
+        "10.0.0.2",
+        "2001:db8::a",
+        "10.0.0.1",
+        "ID#0000000001",
+    ]
+    # Most recently seen first, never seen last.
+    assert addrs(index, index.order("last_recent")) == [
+        "10.0.0.10",
+        "192.0.2.1",
+        "2001:db8::a",
+        "10.0.0.1",
+        "10.0.0.2",
+        "ID#0000000001",
+    ]
+    assert addrs(index, index.order("severity")) == [
+        "10.0.0.10",
+        "192.0.2.1",
+        "10.0.0.2",
+        "2001:db8::a",
+        "10.0.0.1",
+        "ID#0000000001",
+    ]
+
+
+def test_rank_inverts_order(index):
+    for mode in td.SORT_MODES:
+        order, rank = index.order(mode), index.rank(mode)
+        assert [rank[i] for i in order] == list(range(len(order)))
+
+
+def test_query_sorts_matches_and_counts(index):
+    found, counts = index.query("10.0.0", "drop_desc")
+    assert addrs(index, found) == ["10.0.0.10", "10.0.0.2", "10.0.0.1"]
+    assert counts == {"ok": 1, "warning": 1, "critical": 1}
+    found, counts = index.query("", "severity")
+    assert found is index.order("severity")
+    assert counts == index.totals == {"ok": 2, "warning": 2, "critical": 2}
+
+
+def test_page(publish):
+    snap = publish([rec(f"10.0.0.{i}", drops=i % 3) for i in range(1, 10)])
+    total, counts, page = td._page(snap, td.View("10.0.0.", "drop_desc", 2, 3))
+    assert total == 9
+    assert [row["addr"] for row in page] == ["10.0.0.8", "10.0.0.1", "10.0.0.4"]
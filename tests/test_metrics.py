@@ -0,0 +1,21 @@
+from conftest import td
+
+
+def test_metrics_top_clients(publish):
+    snap = publish(
+        [td.ClientRecord(f"10.0.0.{i}", ntp_hits=i, ntp_drops=i) for i in range(5)]
+    )
+    text = td.render_metrics(snap, 2)
+    assert "ticc_dash_clients 5" in text
+    drops = [line for line in text.splitlines() if line.startswith("ticc_dash_client_")]
+    assert any('addr="10.0.0.4"' in line for line in drops)
+    assert not any('addr="10.0.0.0"' in line for line in drops)
+
+
+def test_metrics_cache_bounded(publish):
+    snap = publish([td.ClientRecord("10.0.0.1")])
+    td.render_metrics(snap, td.METRICS_CLIENTS)
+    for top in range(1, 3 * td.VIEW_CACHE):
+        td.render_metrics(snap, top)
+    assert len(snap.views) == td.VIEW_CACHE
+    assert sum(1 for key in snap.cache if key[0] == "metrics") == 1
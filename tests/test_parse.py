@@ -0,0 +1,55 @@
+from conftest import td
+
+OUTPUT = """\
+192.0.2.10,120,3,6,-,45,0,0,-,-
+2001:db8::1,5,0,-2,4,4294967295,2,1,-4,17
+198.51.100.7,9,0,-,-,-,0,0,-,-
+"""
+
+
+def test_parse_fields():
+    first, second, third = td.parse_chronyc_csv(OUTPUT)
+    assert first.addr == "192.0.2.10"
+    assert (first.ntp_hits, first.ntp_drops, first.ntp_interval) == (120, 3, 6)
+    assert first.ntp_timeout_interval == td.INVALID_RATE
+    assert first.last_ntp == 45
+    assert first.cmd_interval == td.INVALID_RATE
+    assert first.last_cmd is None
+    assert second.ntp_interval == -2
+    assert second.last_ntp is None
+    assert (second.cmd_hits, second.cmd_drops, second.cmd_interval) == (2, 1, -4)
+    assert second.last_cmd == 17
+    assert third.last_ntp is None
+
+
+def test_parse_rows_match_chronyc():
+    rec = td.parse_chronyc_csv(OUTPUT)[0]
+    td._stamp_seen([rec], {}, 1000.4)
+    row = rec.to_row()
+    assert row == {
+        "addr": "192.0.2.10",
+        "NTP": "120",
+        "Drop": "3",
+        "Int": "6",
+        "IntL": "-",
+        "Seen": 955,
+        "Cmd": "0",
+        "sev": 1,
+    }
+
+
+def test_parse_skips_bad_lines():
+    output = "\n".join(
+        (
+            "",
+            "506 Cannot talk to daemon",
+            "192.0.2.1,x,0,-,-,-,0,0,-,-",
+            "192.0.2.2,1,0,-,-,-,0,0,-",
+            "192.0.2.3,1,0,-,-,-,0,0,-,-",
+        )
+    )
+    assert [r.addr for r in td.parse_chronyc_csv(output)] == ["192.0.2.3"]
+
+
+def test_parse_empty():
+    assert td.parse_chronyc_csv("") == []
@@ -0,0 +1,186 @@
+import threading
+import time
+
+import pytest
+
+from conftest import td
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(td.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def names(monkeypatch):
+    """Stub DNS: address -> name, or an exception to raise."""
+    table = {}
+    asked = []
+
+    def getnameinfo(sockaddr, flags):
+        addr = sockaddr[0]
+        asked.append(addr)
+        answer = table.get(addr, OSError("not found"))
+        if isinstance(answer, BaseException):
+            raise answer
+        if callable(answer):
+            answer = answer()
+        return answer, "0"
+
+    monkeypatch.setattr(td.socket, "getnameinfo", getnameinfo)
+    table["asked"] = asked
+    return table
+
+
+def resolver(backlog=64, **kwargs):
+    # No worker threads: tests run the queued lookups themselves.
+    r = td.Resolver(workers=0, **kwargs)
+    r.backlog = backlog
+    return r
+
+
+def drain(r):
+    while not r._queue.empty():
+        r._lookup(r._queue.get_nowait())
+
+
+def records(*addrs):
+    return [td.ClientRecord(a) for a in addrs]
+
+
+def hostnames(r, *addrs):
+    recs = records(*addrs)
+    r.annotate(recs)
+    return [rec.hostname for rec in recs]
+
+
+def test_lookup_then_cached(clock, names):
+    names["192.0.2.1"] = "host.example.net"
+    r = resolver()
+    assert hostnames(r, "192.0.2.1", "ID#0000000001") == [None, None]
+    drain(r)
+    assert hostnames(r, "192.0.2.1") == ["host.example.net"]
+    assert names["asked"] == ["192.0.2.1"]
+    assert r.status() == {
+        "cached": 1,
+        "pending": 0,
+        "lookups": 1,
+        "failures": 0,
+        "timeouts": 0,
+    }
+
+
+def test_refresh_after_ttl_keeps_stale_name(clock, names):
+    names["192.0.2.1"] = "old.example.net"
+    r = resolver(ttl=60, negative_ttl=10)
+    hostnames(r, "192.0.2.1")
+    drain(r)
+    clock[0] += 61
+    names["192.0.2.1"] = "new.example.net"
+    # Still shown while the refresh is queued, and queued only once.
+    assert hostnames(r, "192.0.2.1") == ["old.example.net"]
+    assert hostnames(r, "192.0.2.1") == ["old.example.net"]
+    assert r._queue.qsize() == 1
+    drain(r)
+    assert hostnames(r, "192.0.2.1") == ["new.example.net"]
+
+
+def test_negative_cache(clock, names):
+    r = resolver(ttl=60, negative_ttl=10)
+    hostnames(r, "192.0.2.7")
+    drain(r)
+    assert r.status()["failures"] == 1
+    clock[0] += 9
+    assert hostnames(r, "192.0.2.7") == [None]
+    assert r._queue.empty()
+    clock[0] += 2
+    names["192.0.2.7"] = "late.example.net"
+    hostnames(r, "192.0.2.7")
+    drain(r)
+    assert hostnames(r, "192.0.2.7") == ["late.example.net"]
+    assert names["asked"] == ["192.0.2.7", "192.0.2.7"]
+
+
+def test_bad_names_are_failures(clock, names):
+    names["192.0.2.8"] = UnicodeError("bad label")
+    r = resolver()
+    hostnames(r, "192.0.2.8")
+    drain(r)
+    assert r.status()["failures"] == 1
+    assert hostnames(r, "192.0.2.8") == [None]
+
+
+def test_backlog_limit(clock, names):
+    r = resolver(backlog=2)
+    addrs = [f"192.0.2.{i}" for i in range(5)]
+    for addr in addrs:
+        names[addr] = f"h{addr[-1]}"
+    hostnames(r, *addrs)
+    hostnames(r, *addrs)
+    assert r._queue.qsize() == 2
+    drain(r)
+    hostnames(r, *addrs)
+    drain(r)
+    hostnames(r, *addrs)
+    drain(r)
+    assert hostnames(r, *addrs) == ["h0", "h1", "h2", "h3", "h4"]
+    assert len(names["asked"]) == 5
+
+
+def test_lru_eviction(clock, names):
+    for i in range(4):
+        names[f"192.0.2.{i}"] = f"h{i}"
+    r = resolver(size=2)
+    hostnames(r, "192.0.2.0", "192.0.2.1")
+    drain(r)
+    # Using an entry makes it the most recent one.
+    hostnames(r, "192.0.2.0")
+    hostnames(r, "192.0.2.2")
+    drain(r)
+    assert list(r._cache) == ["192.0.2.0", "192.0.2.2"]
+    assert r.status()["cached"] == 2
+
+
+def test_overdue_lookup(clock, names):
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        assert release.wait(5)
+        return "slow.example.net"
+
+    names["192.0.2.9"] = slow
+    r = resolver(timeout=2, negative_ttl=30)
+    hostnames(r, "192.0.2.9")
+    worker = threading.Thread(target=r._lookup, args=(r._queue.get_nowait(),))
+    worker.start()
+    try:
+        assert started.wait(5)
+        clock[0] += 3
+        # Counted (and cached as a failure) once, while it keeps running.
+        assert hostnames(r, "192.0.2.9") == [None]
+        assert hostnames(r, "192.0.2.9") == [None]
+        status = r.status()
+        assert (status["timeouts"], status["pending"]) == (1, 1)
+        assert r._queue.empty()
+    finally:
+        release.set()
+        worker.join(5)
+    # The late answer replaces the failure.
+    assert hostnames(r, "192.0.2.9") == ["slow.example.net"]
+    assert r.status()["pending"] == 0
+    assert not r._overdue
+
+
+def test_worker_threads(names):
+    names["192.0.2.1"] = "threaded.example.net"
+    r = td.Resolver(workers=2)
+    hostnames(r, "192.0.2.1")
+    for _ in range(500):
+        if r.status()["lookups"]:
+            break
+        time.sleep(0.01)
+    assert hostnames(r, "192.0.2.1") == ["threaded.example.net"]
@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import td
+
+
+def rec(addr, ntp=1, drops=0):
+    return td.ClientRecord(addr, ntp_hits=ntp, ntp_drops=drops)
+
+
+def parse(event):
+    """``(id, event type, data)`` of one SSE event."""
+    fields = dict(line.split(": ", 1) for line in event.strip().split("\n"))
+    return fields["id"], fields["event"], json.loads(fields["data"])
+
+
+@pytest.fixture
+def versions(publish):
+    first = publish([rec("10.0.0.1"), rec("10.0.0.2")])
+    second = publish([rec("10.0.0.1", 2), rec("10.0.0.3")])
+    return first, second
+
+
+def test_first_event_is_snapshot(versions):
+    _, second = versions
+    event, since, last = td._sse_next(second, None, None, None)
+    tag, kind, data = parse(event)
+    assert (tag, kind, since) == (second.tag, "snapshot", second.tag)
+    assert [row["addr"] for row in data["clients_parsed"]] == ["10.0.0.1", "10.0.0.3"]
+    assert "local_time" in data
+
+
+def test_resume_sends_delta(versions):
+    first, second = versions
+    event, since, _ = td._sse_next(second, None, first.tag, None)
+    tag, kind, data = parse(event)
+    assert (tag, kind) == (second.tag, "delta")
+    assert data["since"] == first.tag
+    assert data["removed"] == ["10.0.0.2"]
+    assert [row["addr"] for row in data["added"]] == ["10.0.0.3"]
+
+
+def test_resume_from_unknown_version_sends_snapshot(versions):
+    _, second = versions
+    _, kind, _ = parse(td._sse_next(second, None, "gone.7", None)[0])
+    assert kind == "snapshot"
+
+
+def test_nothing_new(versions):
+    _, second = versions
+    assert td._sse_next(second, None, second.tag, "key") == ("", second.tag, "key")
+
+
+def test_page_key_suppresses_unchanged_page(publish):
+    view = td.View("", "ip_order", 0, 2)
+    first = publish([rec("10.0.0.1"), rec("10.0.0.2"), rec("10.0.0.3")])
+    event, since, key = td._sse_next(first, view, None, None)
+    assert parse(event)[1] == "page"
+    # A change below the page: new version, nothing to send.
+    second = publish([rec("10.0.0.1"), rec("10.0.0.2"), rec("10.0.0.3", 9)])
+    event, since, key2 = td._sse_next(second, view, since, key)
+    assert (event, since, key2) == ("", second.tag, key)
+    # A change on the page is sent.
+    third = publish([rec("10.0.0.1", 5), rec("10.0.0.2"), rec("10.0.0.3", 9)])
+    event, since, _ = td._sse_next(third, view, since, key)
+    tag, kind, data = parse(event)
+    assert (tag, kind, since) == (third.tag, "page", third.tag)
+    assert data["clients_parsed"][0]["NTP"] == "5"
+
+
+def test_flask_stream_resumes_and_keeps_alive(publish, monkeypatch):
+    monkeypatch.setattr(td, "STREAM_HEARTBEAT", 0.05)
+    # Started first: starting the collector forgets earlier versions.
+    td.collector.get()
+    first = publish([rec("10.0.0.1")])
+    second = publish([rec("10.0.0.1"), rec("10.0.0.2")])
+    client = td.app.test_client()
+    resp = client.get("/stream", headers={"Last-Event-ID": first.tag}, buffered=False)
+    chunks = (chunk.decode() for chunk in resp.response)
+    try:
+        assert next(chunks) == "retry: 3000\n\n"
+        tag, kind, data = parse(next(chunks))
+        assert (tag, kind) == (second.tag, "delta")
+        assert [row["addr"] for row in data["added"]] == ["10.0.0.2"]
+        assert next(chunks) == ": keepalive\n\n"
+    finally:
+        resp.close()
+
+
+def test_asgi_stream_resumes_and_keeps_alive(publish, monkeypatch):
+    monkeypatch.setattr(td, "STREAM_HEARTBEAT", 0.05)
+
+    async def main():
+        td.collector.start_async()
+        await td.collector.aget()
+        first = publish([rec("10.0.0.1")])
+        second = publish([rec("10.0.0.1"), rec("10.0.0.2")])
+        bodies, done = [], asyncio.Event()
+
+        async def receive():
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                bodies.append(message["body"].decode())
+                if len(bodies) == 2:
+                    done.set()
+
+        scope = {
+            "type": "http",
+            "path": "/stream",
+            "query_string": b"",
+            "headers": [(b"last-event-id", first.tag.encode())],
+        }
+        try:
+            await asyncio.wait_for(td.asgi_app(scope, receive, send), 5)
+        finally:
+            td.collector.stop_async()
+        return second, bodies
+
+    second, bodies = asyncio.run(main())
+    retry, _, event = bodies[0].partition("\n\n")
+    assert retry == "retry: 3000"
+    tag, kind, data = parse(event)
+    assert (tag, kind) == (second.tag, "delta")
+    assert bodies[1] == ": keepalive\n\n"
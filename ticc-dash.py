@@ -1,119 +1,2492 @@
 # ticc-dash.py
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, abort, jsonify, request
+from werkzeug.datastructures import MultiDict
+from werkzeug.wrappers import Request
 import subprocess
 from datetime import datetime
+import argparse
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import csv
+import functools
+import gzip
+import hashlib
+import heapq
+import http
+import io
+import ipaddress
+import json
+import math
+import os
+import queue
+import random
+import secrets
 import socket
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # per-client history and rate-based severity need numpy
+    np = None
+
+try:
+    import orjson
+except ImportError:  # falls back to the json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # /data?format=msgpack is then unavailable
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # assets are then served with gzip only
+    brotli = None
+
+try:
+    import uvicorn
+except ImportError:  # serve_asgi falls back to the built-in asyncio server
+    uvicorn = None
 
 app = Flask(__name__)
 
+COLLECT_INTERVAL = float(os.environ.get("TICC_DASH_INTERVAL", "1.0"))
+# auto: chronyd socket, falling back to sudo chronyc; or socket, chronyc.
+# udp is only for testing against tools/fake_chronyd.py.
+CHRONY_SOURCE = os.environ.get("TICC_DASH_SOURCE", "auto")
+CHRONY_SOCKET = os.environ.get(
+    "TICC_DASH_CHRONY_SOCKET", "/var/run/chrony/chronyd.sock"
+)
+CHRONY_SOCKET_DIR = os.environ.get("TICC_DASH_SOCKET_DIR") or None
+CHRONY_HOST = os.environ.get("TICC_DASH_CHRONY_HOST", "127.0.0.1")
+CHRONY_PORT = int(os.environ.get("TICC_DASH_CHRONY_PORT", "323"))
+CHRONY_TIMEOUT = float(os.environ.get("TICC_DASH_CHRONY_TIMEOUT", "1.0"))
+# Seconds sudo chronyc may take before it is killed (large tables take a while)
+CHRONYC_TIMEOUT = float(os.environ.get("TICC_DASH_CHRONYC_TIMEOUT", "30"))
+NATIVE_RETRY_AFTER = 60.0
+# JSON file listing chronyd servers to aggregate (see README); unset = local only
+SERVERS_FILE = os.environ.get("TICC_DASH_SERVERS") or None
+# How many past versions /data?since= can still answer with a delta.
+DELTA_HISTORY = int(os.environ.get("TICC_DASH_DELTA_HISTORY", "64"))
+# Per-client history: one sample every STEP seconds, kept for SPAN seconds.
+HISTORY_STEP = float(os.environ.get("TICC_DASH_HISTORY_STEP", "120"))
+HISTORY_SPAN = float(os.environ.get("TICC_DASH_HISTORY_SPAN", "86400"))
+HISTORY_DIR = os.environ.get("TICC_DASH_HISTORY_DIR") or None
+# Severity counts the drops seen within this many seconds.
+RATE_WINDOW = float(os.environ.get("TICC_DASH_RATE_WINDOW", "3600"))
+# Reverse DNS of client addresses: concurrent lookups (0 = off) and how many
+# seconds names, failures and a single lookup may take or be kept.
+RESOLVE_WORKERS = int(os.environ.get("TICC_DASH_RESOLVE_WORKERS", "8"))
+RESOLVE_TTL = float(os.environ.get("TICC_DASH_RESOLVE_TTL", "3600"))
+RESOLVE_NEGATIVE_TTL = float(os.environ.get("TICC_DASH_RESOLVE_NEGATIVE_TTL", "300"))
+RESOLVE_TIMEOUT = float(os.environ.get("TICC_DASH_RESOLVE_TIMEOUT", "2.0"))
+RESOLVE_CACHE = 1 << 18
+# /metrics: per-client series for the N clients with the most drops (0 = off)
+METRICS_CLIENTS = int(os.environ.get("TICC_DASH_METRICS_CLIENTS", "0"))
+METRICS_CLIENTS_MAX = 1000
+PAGE_LIMIT = 100
+PAGE_LIMIT_MAX = 1000
+# Encoded pages/searches kept per snapshot (least recently used are dropped)
+VIEW_CACHE = 64
+# /data bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+# Seconds between keepalive comments on an idle /stream connection.
+STREAM_HEARTBEAT = float(os.environ.get("TICC_DASH_HEARTBEAT", "15"))
+# /debug/perf: durations kept per stage for the percentiles
+PERF_SAMPLES = int(os.environ.get("TICC_DASH_PERF_SAMPLES", "1024"))
+# Allow /debug/profile (sampling profiler) to be run
+PROFILER_ENABLED = os.environ.get("TICC_DASH_PROFILER", "") == "1"
+PROFILE_MAX_SECONDS = 60.0
+
+# Stage timings of the collection or request being handled (Perf.collecting).
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+class Perf:
+    """Rolling per-stage durations and error counters for /debug/perf.
+
+    Recording is a deque append; percentiles are only computed when asked.
+    Stages recorded inside ``collecting()`` are also summed into its dict,
+    which is how a collection or a /data request knows its own timings.
+    """
+
+    def __init__(self, keep=PERF_SAMPLES):
+        self.keep = keep
+        self.samples = {}
+        self.totals = collections.Counter()
+        self.counters = collections.Counter()
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = collections.deque(maxlen=self.keep)
+            samples.append(seconds)
+            self.totals[stage] += 1
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def collecting(self):
+        timings = {}
+        token = _stage_timings.set(timings)
+        try:
+            yield timings
+        finally:
+            _stage_timings.reset(token)
+
+    def summary(self):
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+            totals = dict(self.totals)
+            counters = dict(self.counters)
+        stages = {}
+        for stage, values in sorted(samples.items()):
+            n = len(values)
 
-def _is_ipv4(addr: str) -> bool:
+            def pct(p):
+                return round(values[min(n - 1, int(p / 100 * n))] * 1000, 3)
+
+            stages[stage] = {
+                "count": totals[stage],
+                "window": n,
+                "p50_ms": pct(50),
+                "p95_ms": pct(95),
+                "p99_ms": pct(99),
+                "max_ms": round(values[-1] * 1000, 3),
+            }
+        return {"stages": stages, "counters": counters}
+
+
+perf = Perf()
+
+
+class StackSampler:
+    """Sampling profiler over ``sys._current_frames()``.
+
+    Returns collapsed stacks (``thread;outer;...;inner count`` per line), the
+    input format of flamegraph.pl and speedscope. One capture at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def capture(self, seconds, interval):
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            counts = collections.Counter()
+            me = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        name = os.path.basename(code.co_filename)
+                        stack.append(f"{code.co_name} ({name}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    counts[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+        finally:
+            self._lock.release()
+
+
+sampler = StackSampler()
+
+
+# Client addresses repeat from one sample to the next.
+@functools.lru_cache(maxsize=1 << 18)
+def _sort_key(addr: str) -> bytes:
+    # IPv4 (numeric), then IPv6 (numeric), then names; compared as plain bytes.
     try:
-        socket.inet_pton(socket.AF_INET, addr)
-        return True
+        if ":" in addr:
+            return b"\x06" + socket.inet_pton(socket.AF_INET6, addr)
+        return b"\x04" + socket.inet_pton(socket.AF_INET, addr)
     except OSError:
-        return False
+        return b"\x7f" + addr.lower().encode()
+
+
+# chronyd command/monitoring protocol (candm.h), protocol version 6.
+PROTO_VERSION = 6
+PKT_TYPE_CMD_REQUEST = 1
+PKT_TYPE_CMD_REPLY = 2
+REQ_CLIENT_ACCESSES_BY_INDEX3 = 68
+RPY_CLIENT_ACCESSES_BY_INDEX3 = 21
+MAX_CLIENT_ACCESSES = 8
+INVALID_RATE = -128
+NO_HIT = 0xFFFFFFFF
+
+_REQ_HEADER = struct.Struct("!BBBBHHIII")
+_REQ_CLIENT_ACCESSES = struct.Struct("!IIIIi")
+_RPY_HEADER = struct.Struct("!BBBBHHHHHHIII")
+_RPY_CLIENT_ACCESSES = struct.Struct("!III")
+_RPY_CLIENT_ACCESS = struct.Struct("!16sH2xIIIIIIbbbbIII")
+_RPY_CLIENT_ACCESSES_LEN = (
+    _RPY_HEADER.size
+    + _RPY_CLIENT_ACCESSES.size
+    + MAX_CLIENT_ACCESSES * _RPY_CLIENT_ACCESS.size
+    + 4
+)
+
+_STATUS_TEXT = {
+    1: "failed",
+    2: "not authorised",
+    3: "invalid command",
+    6: "not enabled",
+    18: "bad packet version",
+    19: "bad packet length",
+}
+
+
+class ChronyError(Exception):
+    pass
+
+
+class ClientRecord:
+    __slots__ = (
+        "addr",
+        "ntp_hits",
+        "ntp_drops",
+        "ntp_interval",
+        "ntp_timeout_interval",
+        "last_ntp",
+        "cmd_hits",
+        "cmd_drops",
+        "cmd_interval",
+        "last_cmd",
+        "sort_key",
+        "sev",
+        "recent_drops",
+        "servers",
+        "hostname",
+        "seen_ntp",
+        "seen_cmd",
+    )
+
+    def __init__(
+        self,
+        addr,
+        ntp_hits=0,
+        ntp_drops=0,
+        ntp_interval=INVALID_RATE,
+        ntp_timeout_interval=INVALID_RATE,
+        last_ntp=None,
+        cmd_hits=0,
+        cmd_drops=0,
+        cmd_interval=INVALID_RATE,
+        last_cmd=None,
+    ):
+        self.addr = addr
+        self.ntp_hits = ntp_hits
+        self.ntp_drops = ntp_drops
+        self.ntp_interval = ntp_interval
+        self.ntp_timeout_interval = ntp_timeout_interval
+        self.last_ntp = last_ntp
+        self.cmd_hits = cmd_hits
+        self.cmd_drops = cmd_drops
+        self.cmd_interval = cmd_interval
+        self.last_cmd = last_cmd
+        self.sort_key = _sort_key(addr)
+        self.sev = None
+        self.recent_drops = None
+        self.servers = ()
+        self.hostname = None
+        # Unix time of the last hit; ``last_*`` is its age at collection.
+        self.seen_ntp = None
+        self.seen_cmd = None
+
+    def _values(self):
+        return (
+            self.addr,
+            self.ntp_hits,
+            self.ntp_drops,
+            self.ntp_interval,
+            self.ntp_timeout_interval,
+            self.seen_ntp,
+            self.cmd_hits,
+            self.cmd_drops,
+            self.cmd_interval,
+            self.seen_cmd,
+            self.severity,
+            self.recent_drops,
+            self.servers,
+            self.hostname,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, ClientRecord):
+            return NotImplemented
+        return self._values() == other._values()
+
+    @property
+    def severity(self):
+        # 0 OK, 1 Warning, 2 Critical; rate-based when history set ``sev``.
+        if self.sev is not None:
+            return self.sev
+        if self.ntp_drops >= 10:
+            return 2
+        return 1 if self.ntp_drops > 0 else 0
+
+    def to_row(self):
+        row = {
+            "addr": self.addr,
+            "NTP": str(self.ntp_hits),
+            "Drop": str(self.ntp_drops),
+            "Int": _format_rate(self.ntp_interval),
+            "IntL": _format_rate(self.ntp_timeout_interval),
+            "Seen": self.seen_ntp,
+            "Cmd": str(self.cmd_hits),
+            "sev": self.severity,
+        }
+        if self.servers:
+            row["servers"] = list(self.servers)
+        if self.hostname:
+            row["hostname"] = self.hostname
+        return row
+
+
+def _format_rate(rate):
+    return "-" if rate == INVALID_RATE else str(rate)
+
+
+def _stamp_seen(records, before, now):
+    """Set ``seen_*`` from the ages chronyd reports.
+
+    The ages grow on every collection, so a client whose hit count has not
+    changed keeps the time from ``before`` (records by address); otherwise
+    a quiet table would look changed every second.
+    """
+    for rec in records:
+        old = before.get(rec.addr)
+        if old is not None and old.ntp_hits == rec.ntp_hits:
+            rec.seen_ntp = old.seen_ntp
+        elif rec.last_ntp is not None:
+            rec.seen_ntp = round(now - rec.last_ntp)
+        if old is not None and old.cmd_hits == rec.cmd_hits:
+            rec.seen_cmd = old.seen_cmd
+        elif rec.last_cmd is not None:
+            rec.seen_cmd = round(now - rec.last_cmd)
+
+
+def _unpack_ip(raw, family):
+    if family == 1:
+        return socket.inet_ntop(socket.AF_INET, raw[:4])
+    if family == 2:
+        return socket.inet_ntop(socket.AF_INET6, raw)
+    if family == 3:
+        return f"ID#{struct.unpack('!I', raw[:4])[0]:010d}"
+    return None
+
+
+class ChronyCmdClient:
+    """Minimal client for chronyd's command socket.
+
+    Talks to the local Unix socket (``path``) or to UDP ``host``:``port``.
+    chronyd only answers the clients request on the Unix socket, which needs
+    access to the socket directory, whatever ``cmdallow`` says; over UDP it
+    replies "not authorised". The UDP transport is for testing against
+    ``tools/fake_chronyd.py``.
+    """
+
+    def __init__(self, path=None, host=None, port=323, timeout=1.0, local_dir=None):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.local_dir = local_dir or (os.path.dirname(path) if path else None)
+        self._sock = None
+        self._local_path = None
+        self._seq = random.getrandbits(32)
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self.path:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            local = os.path.join(
+                self.local_dir, f"ticc-dash.{os.getpid()}.{id(self):x}.sock"
+            )
+            try:
+                os.unlink(local)
+            except FileNotFoundError:
+                pass
+            try:
+                sock.bind(local)
+                # chronyd drops root, so it needs permission to reply to us.
+                os.chmod(local, 0o666)
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                self._unlink_local(local)
+                raise
+            self._local_path = local
+        else:
+            infos = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_DGRAM)
+            family, _, _, _, addr = infos[0]
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.connect(addr)
+        sock.settimeout(self.timeout)
+        self._sock = sock
+
+    @staticmethod
+    def _unlink_local(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._close()
 
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._local_path:
+            self._unlink_local(self._local_path)
+            self._local_path = None
 
-def _is_ipv6(addr: str) -> bool:
+    def _packet(self, payload, attempt):
+        header = _REQ_HEADER.pack(
+            PROTO_VERSION,
+            PKT_TYPE_CMD_REQUEST,
+            0,
+            0,
+            REQ_CLIENT_ACCESSES_BY_INDEX3,
+            attempt,
+            self._seq,
+            0,
+            0,
+        )
+        packet = header + payload
+        # Requests must be at least as long as the reply (anti-amplification).
+        return packet + bytes(max(0, _RPY_CLIENT_ACCESSES_LEN - len(packet)))
+
+    def _match(self, reply):
+        """Reply header if ``reply`` answers the pending request, else None."""
+        if len(reply) < _RPY_HEADER.size:
+            return None
+        head = _RPY_HEADER.unpack_from(reply)
+        if head[1] != PKT_TYPE_CMD_REPLY or head[10] != self._seq:
+            return None
+        return head
+
+    def _request(self, payload):
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        attempts = 1 if self.path else 3
+        for attempt in range(attempts):
+            self._sock.send(self._packet(payload, attempt))
+            deadline = time.monotonic() + self.timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._sock.settimeout(remaining)
+                try:
+                    reply = self._sock.recv(4096)
+                except socket.timeout:
+                    break
+                head = self._match(reply)
+                if head is not None:
+                    return head, reply
+        raise ChronyError("no reply from chronyd")
+
+    async def _arequest(self, payload):
+        loop = asyncio.get_running_loop()
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        attempts = 1 if self.path else 3
+        for attempt in range(attempts):
+            await loop.sock_sendall(self._sock, self._packet(payload, attempt))
+            deadline = loop.time() + self.timeout
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    reply = await asyncio.wait_for(
+                        loop.sock_recv(self._sock, 4096), remaining
+                    )
+                except asyncio.TimeoutError:
+                    break
+                head = self._match(reply)
+                if head is not None:
+                    return head, reply
+        raise ChronyError("no reply from chronyd")
+
+    def clients(self):
+        """Return every client record, paging through chronyd's table."""
+        with self._lock:
+            if self._sock is None:
+                self._open()
+            try:
+                records = []
+                index = 0
+                while index is not None:
+                    head, reply = self._request(self._page_request(index))
+                    index = self._read_page(head, reply, records)
+                return records
+            except (OSError, ChronyError):
+                self._close()
+                raise
+
+    async def aclients(self):
+        """``clients`` with non-blocking socket I/O on the running event loop.
+
+        Callers must not overlap; the collector runs one collection at a time.
+        """
+        if self._sock is None:
+            self._open()
+        self._sock.setblocking(False)
+        try:
+            records = []
+            index = 0
+            while index is not None:
+                head, reply = await self._arequest(self._page_request(index))
+                index = self._read_page(head, reply, records)
+            return records
+        except (OSError, ChronyError):
+            self._close()
+            raise
+
+    @staticmethod
+    def _page_request(index):
+        return _REQ_CLIENT_ACCESSES.pack(index, MAX_CLIENT_ACCESSES, 0, 0, 0)
+
+    @staticmethod
+    def _read_page(head, reply, records):
+        """Append one reply page to ``records``; return the next index or None."""
+        version, _, _, _, _, rpy, status = head[:7]
+        if version != PROTO_VERSION:
+            raise ChronyError(f"unsupported protocol version {version}")
+        if status != 0:
+            raise ChronyError(
+                "chronyd: " + _STATUS_TEXT.get(status, f"status {status}")
+            )
+        if (
+            rpy != RPY_CLIENT_ACCESSES_BY_INDEX3
+            or len(reply) < _RPY_CLIENT_ACCESSES_LEN
+        ):
+            raise ChronyError("unexpected reply from chronyd")
+        n_indices, next_index, n_clients = _RPY_CLIENT_ACCESSES.unpack_from(
+            reply, _RPY_HEADER.size
+        )
+        offset = _RPY_HEADER.size + _RPY_CLIENT_ACCESSES.size
+        end = offset + min(n_clients, MAX_CLIENT_ACCESSES) * _RPY_CLIENT_ACCESS.size
+        # ip, family, ntp/nke/cmd hits, ntp/nke/cmd drops,
+        # ntp/nke/cmd interval, ntp timeout interval, last ntp/nke/cmd
+        for f in _RPY_CLIENT_ACCESS.iter_unpack(reply[offset:end]):
+            addr = _unpack_ip(f[0], f[1])
+            if addr is None:
+                continue
+            records.append(
+                ClientRecord(
+                    addr,
+                    ntp_hits=f[2],
+                    ntp_drops=f[5],
+                    ntp_interval=f[8],
+                    ntp_timeout_interval=f[11],
+                    last_ntp=None if f[12] == NO_HIT else f[12],
+                    cmd_hits=f[4],
+                    cmd_drops=f[7],
+                    cmd_interval=f[10],
+                    last_cmd=None if f[14] == NO_HIT else f[14],
+                )
+            )
+        if next_index >= n_indices or n_clients < MAX_CLIENT_ACCESSES:
+            return None
+        return next_index
+
+
+_CSV_NO_HIT = ("-", str(NO_HIT))
+
+
+def parse_chronyc_csv(output):
+    """Parse ``chronyc -c -n clients`` output into ClientRecord objects.
+
+    Each line is split exactly once. Columns are address, NTP hits, drops,
+    interval, interval limit, last NTP hit, then the same for commands;
+    intervals stay log2 seconds, as chronyd reports them.
+    """
+    records = []
+    append = records.append
+    for line in output.splitlines():
+        f = line.split(",")
+        if len(f) < 10:
+            continue
+        try:
+            append(
+                ClientRecord(
+                    f[0],
+                    int(f[1]),
+                    int(f[2]),
+                    INVALID_RATE if f[3] == "-" else int(f[3]),
+                    INVALID_RATE if f[4] == "-" else int(f[4]),
+                    None if f[5] in _CSV_NO_HIT else int(f[5]),
+                    int(f[6]),
+                    int(f[7]),
+                    INVALID_RATE if f[8] == "-" else int(f[8]),
+                    None if f[9] in _CSV_NO_HIT else int(f[9]),
+                )
+            )
+        except ValueError:
+            continue
+    return records
+
+
+def _make_native_client():
+    # Test-only: a real chronyd does not serve the client table over UDP.
+    if CHRONY_SOURCE == "udp":
+        return ChronyCmdClient(
+            host=CHRONY_HOST, port=CHRONY_PORT, timeout=CHRONY_TIMEOUT
+        )
+    return ChronyCmdClient(
+        path=CHRONY_SOCKET, timeout=CHRONY_TIMEOUT, local_dir=CHRONY_SOCKET_DIR
+    )
+
+
+_native_client = None
+_native_retry_at = 0.0
+
+
+def _get_native_records():
+    global _native_client, _native_retry_at
+    if _native_client is None:
+        _native_client = _make_native_client()
     try:
-        socket.inet_pton(socket.AF_INET6, addr)
-        return True
-    except OSError:
-        return False
+        with perf.timer("socket"):
+            return _native_client.clients()
+    except (OSError, ChronyError):
+        perf.count("socket_errors")
+        _native_retry_at = time.monotonic() + NATIVE_RETRY_AFTER
+        raise
 
 
-def _parse_client_line(line: str):
-    parts = line.split()
-    if not parts:
-        return None
-    addr = parts[0]
-    f = parts[1:]
-
-    def g(i):
-        return f[i] if i < len(f) else ""
-
-    return {
-        "addr": addr,
-        "NTP": g(0),
-        "Drop": g(1),
-        "Int": g(2),
-        "IntL": g(3),
-        "Last": g(4),
-        "Cmd": g(5),
-    }
+async def _aget_native_records():
+    global _native_client, _native_retry_at
+    if _native_client is None:
+        _native_client = _make_native_client()
+    try:
+        with perf.timer("socket"):
+            return await _native_client.aclients()
+    except (OSError, ChronyError):
+        perf.count("socket_errors")
+        _native_retry_at = time.monotonic() + NATIVE_RETRY_AFTER
+        raise
 
 
-def get_chrony_clients():
+CHRONYC_CLIENTS = ("sudo", "chronyc", "-c", "-n", "clients")
+
+
+def _parse_timed(output):
+    with perf.timer("parse"):
+        return parse_chronyc_csv(output)
+
+
+def _get_chronyc_records():
     try:
-        output = subprocess.check_output(
-            ["sudo", "chronyc", "clients"], universal_newlines=True
-        )
+        with perf.timer("chronyc"):
+            output = subprocess.check_output(
+                CHRONYC_CLIENTS, universal_newlines=True, timeout=CHRONYC_TIMEOUT
+            )
+    except (OSError, subprocess.SubprocessError):
+        perf.count("chronyc_errors")
+        raise
+    return _parse_timed(output)
+
+
+async def _aget_chronyc_records():
+    try:
+        with perf.timer("chronyc"):
+            proc = await asyncio.create_subprocess_exec(
+                *CHRONYC_CLIENTS, stdout=asyncio.subprocess.PIPE
+            )
+            try:
+                output, _ = await asyncio.wait_for(proc.communicate(), CHRONYC_TIMEOUT)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise subprocess.TimeoutExpired(CHRONYC_CLIENTS, CHRONYC_TIMEOUT)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, CHRONYC_CLIENTS)
+    except (OSError, subprocess.SubprocessError):
+        perf.count("chronyc_errors")
+        raise
+    # Parsing a large table takes a while; keep it off the event loop.
+    return await asyncio.to_thread(_parse_timed, output.decode())
+
+
+def _get_local_records():
+    if CHRONY_SOURCE in ("socket", "udp"):
+        return _get_native_records()
+    if CHRONY_SOURCE == "auto" and time.monotonic() >= _native_retry_at:
+        try:
+            return _get_native_records()
+        except (OSError, ChronyError):
+            pass
+    return _get_chronyc_records()
+
+
+async def _aget_local_records():
+    if CHRONY_SOURCE in ("socket", "udp"):
+        return await _aget_native_records()
+    if CHRONY_SOURCE == "auto" and time.monotonic() >= _native_retry_at:
+        try:
+            return await _aget_native_records()
+        except (OSError, ChronyError):
+            pass
+    return await _aget_chronyc_records()
+
+
+def collect_clients():
+    """Return ``(records, error)`` with records in address order."""
+    try:
+        records = _get_local_records()
+    except Exception as e:
+        return [], f"Error: {e}"
+    with perf.timer("sort"):
+        records.sort(key=lambda r: r.sort_key)
+    return records, ""
+
+
+async def acollect_clients():
+    """``collect_clients`` without blocking the event loop."""
+    try:
+        records = await _aget_local_records()
     except Exception as e:
-        return [], 0, f"Error: {e}"
-
-    lines = output.strip().split("\n")
-    if len(lines) < 3:
-        return [], 0, ""
-
-    body = [ln.rstrip() for ln in lines[2:] if ln.strip() != ""]
-    hostnames, ipv4s, ipv6s = [], [], []
-    for ln in body:
-        addr = (ln.split() or [""])[0]
-        if _is_ipv4(addr):
-            ipv4s.append(ln)
-        elif _is_ipv6(addr):
-            ipv6s.append(ln)
+        return [], f"Error: {e}"
+    with perf.timer("sort"):
+        await asyncio.to_thread(records.sort, key=lambda r: r.sort_key)
+    return records, ""
+
+
+def _merge_value(a, b, pick):
+    if a is None or a == INVALID_RATE:
+        return b
+    if b is None or b == INVALID_RATE:
+        return a
+    return pick(a, b)
+
+
+def merge_records(groups):
+    """Merge ``(server name, records)`` groups into one table.
+
+    A client seen by several servers becomes one record with summed counters,
+    the most recent last-hit times and the shortest intervals; ``servers``
+    lists every server that saw it.
+    """
+    merged = {}
+    for name, records in groups:
+        for rec in records:
+            cur = merged.get(rec.addr)
+            if cur is None:
+                cur = merged[rec.addr] = ClientRecord(
+                    rec.addr,
+                    rec.ntp_hits,
+                    rec.ntp_drops,
+                    rec.ntp_interval,
+                    rec.ntp_timeout_interval,
+                    rec.last_ntp,
+                    rec.cmd_hits,
+                    rec.cmd_drops,
+                    rec.cmd_interval,
+                    rec.last_cmd,
+                )
+                cur.servers = (name,)
+                continue
+            cur.ntp_hits += rec.ntp_hits
+            cur.ntp_drops += rec.ntp_drops
+            cur.cmd_hits += rec.cmd_hits
+            cur.cmd_drops += rec.cmd_drops
+            cur.ntp_interval = _merge_value(cur.ntp_interval, rec.ntp_interval, min)
+            cur.ntp_timeout_interval = _merge_value(
+                cur.ntp_timeout_interval, rec.ntp_timeout_interval, min
+            )
+            cur.cmd_interval = _merge_value(cur.cmd_interval, rec.cmd_interval, min)
+            cur.last_ntp = _merge_value(cur.last_ntp, rec.last_ntp, min)
+            cur.last_cmd = _merge_value(cur.last_cmd, rec.last_cmd, min)
+            cur.servers += (name,)
+    return list(merged.values())
+
+
+class Endpoint:
+    """One chronyd in the fleet and the last table it returned."""
+
+    def __init__(self, name, fetch, timeout):
+        self.name = name
+        self.fetch = fetch
+        self.timeout = timeout
+        self.records = []
+        self.ok_at = None
+        self.error = ""
+        self.duration = None
+        self.future = None
+
+    @classmethod
+    def from_config(cls, cfg):
+        source = cfg.get("source", "local")
+        name = cfg.get("name") or cfg.get("host") or source
+        timeout = float(cfg.get("timeout", CHRONY_TIMEOUT))
+        if source == "local":
+            fetch = _get_local_records
+        elif source in ("socket", "udp"):
+            # udp is for tools/fake_chronyd.py; remote chronyds need "command".
+            client = ChronyCmdClient(
+                path=cfg.get("path", CHRONY_SOCKET) if source == "socket" else None,
+                host=cfg.get("host"),
+                port=int(cfg.get("port", 323)),
+                timeout=timeout,
+                local_dir=cfg.get("socket_dir", CHRONY_SOCKET_DIR),
+            )
+            fetch = client.clients
+        elif source == "command":
+            command = cfg["command"]
+
+            def fetch():
+                out = subprocess.run(
+                    command,
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout,
+                    check=True,
+                )
+                return parse_chronyc_csv(out.stdout)
+
         else:
-            hostnames.append(ln)
+            raise ValueError(f"{name}: unknown source {source!r}")
+        return cls(name, fetch, timeout)
+
+    def _run(self):
+        started = time.monotonic()
+        try:
+            self.records = self.fetch()
+            self.ok_at = time.time()
+            self.error = ""
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            self.duration = time.monotonic() - started
+
+    def status(self, now):
+        age = None if self.ok_at is None else now - self.ok_at
+        return {
+            "name": self.name,
+            "count": len(self.records),
+            # From the last completed (or overrun) fetch, not one in progress.
+            "stale": bool(self.error) or self.ok_at is None,
+            "age": age,
+            "duration": self.duration,
+            "error": self.error,
+        }
+
 
-    hostnames.sort(key=lambda x: x.split()[0].lower())
-    ipv4s.sort(key=lambda x: tuple(map(int, (x.split()[0]).split("."))))
-    ipv6s.sort(key=lambda x: x.split()[0])
-    sorted_lines = hostnames + ipv4s + ipv6s
+class Fleet:
+    """Collects client tables from several chronyd servers concurrently.
 
-    parsed = []
-    for ln in sorted_lines:
-        row = _parse_client_line(ln)
-        if row:
-            parsed.append(row)
-    return parsed, len(parsed), ""
+    Every endpoint runs in a bounded thread pool with its own timeout, so a
+    refresh takes about as long as the slowest server. An endpoint that fails
+    or overruns keeps contributing its last table, marked stale, until it is
+    ``expire`` seconds old; a fetch still running is never started twice.
+    """
+
+    def __init__(self, endpoints, expire=300.0, workers=16):
+        names = [ep.name for ep in endpoints]
+        if len(set(names)) != len(names):
+            raise ValueError("server names must be unique")
+        self.endpoints = endpoints
+        self.expire = expire
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(workers, len(endpoints)) or 1,
+            thread_name_prefix="ticc-dash-fleet",
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            cfg = json.load(f)
+        endpoints = [Endpoint.from_config(c) for c in cfg["servers"]]
+        return cls(endpoints, float(cfg.get("expire", 300)))
+
+    def collect(self):
+        started = time.monotonic()
+        for ep in self.endpoints:
+            if ep.future is None:
+                ep.future = self._pool.submit(ep._run)
+        pending = {ep.future: ep for ep in self.endpoints}
+        while pending:
+            deadline = max(started + ep.timeout for ep in pending.values())
+            done, _ = concurrent.futures.wait(
+                pending,
+                timeout=max(0.0, deadline - time.monotonic()),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for fut in done:
+                pending.pop(fut).future = None
+            now = time.monotonic()
+            for fut, ep in list(pending.items()):
+                if now >= started + ep.timeout:
+                    # Leave it running; its result is used by a later refresh.
+                    del pending[fut]
+                    if not ep.error:
+                        ep.error = f"timed out after {ep.timeout:g}s"
+
+        now = time.time()
+        groups, errors = [], []
+        for ep in self.endpoints:
+            if ep.error:
+                errors.append(f"{ep.name}: {ep.error}")
+            if ep.ok_at is not None and now - ep.ok_at <= self.expire:
+                groups.append((ep.name, ep.records))
+        records = merge_records(groups)
+        records.sort(key=lambda r: r.sort_key)
+        return records, "; ".join(errors)
+
+    def status(self):
+        now = time.time()
+        return [ep.status(now) for ep in self.endpoints]
+
+
+class Resolver:
+    """Reverse DNS for client addresses, kept out of collection and requests.
+
+    ``annotate`` only reads the cache and queues lookups for addresses that
+    are missing or expired; at most ``workers`` lookups run at once on daemon
+    threads (so a hung lookup never delays shutdown), and at most ``backlog``
+    wait for a worker. Names are cached
+    for ``ttl`` seconds and failures for ``negative_ttl``, in an LRU of
+    ``size`` addresses. A lookup that overruns ``timeout`` is cached as a
+    failure while it keeps running; a late answer still replaces it.
+    """
+
+    def __init__(
+        self, workers=8, ttl=3600.0, negative_ttl=300.0, timeout=2.0, size=1 << 18
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.size = size
+        self.backlog = 64 * workers
+        self.lookups = 0
+        self.failures = 0
+        self.timeouts = 0
+        self._cache = collections.OrderedDict()  # addr -> (name or None, expires)
+        self._pending = {}  # addr -> start time, None while queued
+        self._overdue = set()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        for i in range(workers):
+            threading.Thread(
+                target=self._run, name=f"ticc-dash-dns-{i}", daemon=True
+            ).start()
+
+    def _store(self, addr, name, ttl):
+        self._cache[addr] = (name, time.monotonic() + ttl)
+        self._cache.move_to_end(addr)
+        if len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    def _run(self):
+        while True:
+            self._lookup(self._queue.get())
+
+    def _lookup(self, addr):
+        with self._lock:
+            self._pending[addr] = time.monotonic()
+        try:
+            with perf.timer("resolve"):
+                name = socket.getnameinfo((addr, 0), socket.NI_NAMEREQD)[0]
+        except (OSError, UnicodeError):
+            name = None
+        with self._lock:
+            del self._pending[addr]
+            self._overdue.discard(addr)
+            self.lookups += 1
+            if name is None:
+                self.failures += 1
+                self._store(addr, None, self.negative_ttl)
+            else:
+                self._store(addr, name, self.ttl)
+
+    def annotate(self, records):
+        """Set ``hostname`` on ``records`` from the cache and queue lookups
+        for the addresses it cannot answer (yet)."""
+        now = time.monotonic()
+        cache, pending = self._cache, self._pending
+        todo = []
+        with self._lock:
+            for addr, started in pending.items():
+                if started is not None and now - started > self.timeout:
+                    if addr not in self._overdue:
+                        self._overdue.add(addr)
+                        self.timeouts += 1
+                        self._store(addr, None, self.negative_ttl)
+            room = self.backlog - sum(s is None for s in pending.values())
+            for rec in records:
+                addr = rec.addr
+                entry = cache.get(addr)
+                if entry is not None:
+                    # Stale names are shown until their refresh completes.
+                    cache.move_to_end(addr)
+                    rec.hostname = entry[0]
+                    if entry[1] > now:
+                        continue
+                if room > 0 and addr not in pending and not addr.startswith("ID#"):
+                    pending[addr] = None
+                    todo.append(addr)
+                    room -= 1
+        for addr in todo:
+            self._queue.put(addr)
+
+    def status(self):
+        with self._lock:
+            return {
+                "cached": len(self._cache),
+                "pending": len(self._pending),
+                "lookups": self.lookups,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+            }
+
+
+def get_chrony_clients():
+    records, err = collect_clients()
+    parsed = [rec.to_row() for rec in records]
+    return parsed, len(parsed), err
 
 
 def get_local_time():
     return datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
 
 
+class Snapshot:
+    __slots__ = (
+        "version",
+        "tag",
+        "collected_at",
+        "records",
+        "error",
+        "cache",
+        "views",
+        "_lock",
+        "_building",
+    )
+
+    def __init__(self, version, tag, collected_at, records, error):
+        self.version = version
+        self.tag = tag
+        self.collected_at = collected_at
+        self.records = records
+        self.error = error
+        # Anything derived from an immutable snapshot is computed once here.
+        self.cache = {}
+        # Entries keyed by client-chosen parameters (a search, a page) are
+        # only kept for the VIEW_CACHE most recently used ones.
+        self.views = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Keys being built -> event set when done; other callers wait for it.
+        self._building = {}
+
+    def peek(self, key):
+        """The cached value for ``key``, or None if it has not been built."""
+        value = self.cache.get(key)
+        return self.views.get(key) if value is None else value
+
+    def cached(self, key, build, bounded=False):
+        if not bounded:
+            try:
+                return self.cache[key]
+            except KeyError:
+                pass
+        with self._lock:
+            if key in self.views:
+                self.views.move_to_end(key)
+                return self.views[key]
+            if key in self.cache:
+                return self.cache[key]
+            building = self._building.get(key)
+            if building is None:
+                building = self._building[key] = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            # Viewers woken by the same version share one build.
+            building.wait()
+            value = self.peek(key)
+            return build() if value is None else value
+        try:
+            value = build()
+            with self._lock:
+                if not bounded:
+                    self.cache[key] = value
+                else:
+                    self.views[key] = value
+                    if len(self.views) > VIEW_CACHE:
+                        self.views.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._building[key]
+            building.set()
+        return value
+
+    @property
+    def count(self):
+        return len(self.records)
+
+    @property
+    def clients(self):
+        return self.cached("clients", lambda: [rec.to_row() for rec in self.records])
+
+    @property
+    def by_addr(self):
+        return self.cached("by_addr", lambda: {rec.addr: rec for rec in self.records})
+
+
+SORT_MODES = ("ip_order", "drop_desc", "last_recent", "severity")
+SEVERITY_NAMES = ("ok", "warning", "critical")
+
+
+class SnapshotIndex:
+    """Orderings and a search index over one snapshot's records.
+
+    Built once per version and shared by every request for it. Orderings are
+    lists of record positions; the search index is all lowercase addresses
+    (and hostnames, when resolved) joined by newlines, so a substring search
+    is a few ``str.find`` calls.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.severities = [rec.severity for rec in records]
+        self.totals = self._count(range(len(records)))
+        keys = [
+            f"{rec.addr} {rec.hostname}".lower() if rec.hostname else rec.addr.lower()
+            for rec in records
+        ]
+        self.haystack = "\n".join(keys)
+        self.starts = []
+        pos = 0
+        for key in keys:
+            self.starts.append(pos)
+            pos += len(key) + 1
+        self._orders = {}
+        self._ranks = {}
+        self._lock = threading.Lock()
+
+    def _count(self, positions):
+        counts = [0, 0, 0]
+        sev = self.severities
+        for i in positions:
+            counts[sev[i]] += 1
+        return dict(zip(SEVERITY_NAMES, counts))
+
+    def order(self, mode):
+        try:
+            return self._orders[mode]
+        except KeyError:
+            pass
+        recs = self.records
+        positions = range(len(recs))
+        # Records are already in address order, so sorts are stable tie-breaks.
+        if mode == "drop_desc":
+            order = sorted(positions, key=lambda i: -recs[i].ntp_drops)
+        elif mode == "last_recent":
+            order = sorted(
+                positions,
+                key=lambda i: (recs[i].seen_ntp is None, -(recs[i].seen_ntp or 0)),
+            )
+        elif mode == "severity":
+            sev = self.severities
+            order = sorted(positions, key=lambda i: -sev[i])
+        else:
+            order = list(positions)
+        with self._lock:
+            return self._orders.setdefault(mode, order)
+
+    def rank(self, mode):
+        try:
+            return self._ranks[mode]
+        except KeyError:
+            pass
+        rank = [0] * len(self.records)
+        for pos, i in enumerate(self.order(mode)):
+            rank[i] = pos
+        with self._lock:
+            return self._ranks.setdefault(mode, rank)
+
+    def search(self, q):
+        """Positions (in address order) whose address or name contains ``q``."""
+        hay, starts = self.haystack, self.starts
+        found = []
+        pos = hay.find(q)
+        while pos != -1:
+            i = bisect.bisect_right(starts, pos) - 1
+            found.append(i)
+            nxt = starts[i + 1] if i + 1 < len(starts) else len(hay)
+            pos = hay.find(q, nxt)
+        return found
+
+    def query(self, q, mode):
+        """``(positions, severity counts)`` matching ``q``, sorted by ``mode``."""
+        if not q:
+            return self.order(mode), self.totals
+        if "\n" in q:
+            return [], self._count(())
+        found = self.search(q)
+        if mode != "ip_order":
+            found.sort(key=self.rank(mode).__getitem__)
+        return found, self._count(found)
+
+
+def snapshot_index(snap):
+    return snap.cached("index", lambda: SnapshotIndex(snap.records))
+
+
+def snapshot_delta(old, new):
+    """Rows added, removed and changed between two snapshots."""
+
+    def build():
+        before = old.by_addr
+        added, changed = [], []
+        for rec in new.records:
+            prev = before.get(rec.addr)
+            if prev is None:
+                added.append(rec.to_row())
+            elif prev != rec:
+                changed.append(rec.to_row())
+        now = new.by_addr
+        removed = [addr for addr in before if addr not in now]
+        return added, removed, changed
+
+    return new.cached(("delta", old.tag), build)
+
+
+class Collector:
+    """Samples chronyd on a fixed cadence and keeps the latest snapshot.
+
+    Every request reads ``snapshot`` instead of running chronyc itself, so the
+    chronyc load is independent of the number of open dashboards. The version
+    only changes when the collected data does; ``tag`` adds a per-process
+    epoch so versions from different workers or restarts never collide.
+    """
+
+    def __init__(self, fetch, interval, afetch=None, keep=DELTA_HISTORY):
+        self._fetch = fetch
+        self._afetch = afetch
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.epoch = ""
+        self.snapshot = Snapshot(0, "", 0.0, [], "")
+        self._recent = collections.deque(maxlen=keep)
+        self._changed = threading.Condition()
+        # Called with the freshly collected records before they are compared.
+        self.hooks = []
+        self.collections = 0
+        self.failures = 0
+        self.last_duration = 0.0
+        # Stage durations of the last collection (Server-Timing).
+        self.timings = {}
+        # Event-loop mode (start_async): the collection task, the collection
+        # in flight, and an event set when the next snapshot is published.
+        self._task = None
+        self._inflight = None
+        self._published = None
+
+    def start(self):
+        if self._pid == os.getpid() and self._task is not None:
+            return
+        # gunicorn forks after import, so each worker starts its own thread.
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            self._ready.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="ticc-dash-collector", daemon=True
+            )
+            self._pid = os.getpid()
+            self.epoch = secrets.token_hex(4)
+            self._recent.clear()
+            self._thread.start()
+
+    def _running(self):
+        # No thread after stop_async() in a process that collected on a loop.
+        return (
+            self._pid == os.getpid()
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.collect()
+            except Exception:
+                app.logger.exception("collection failed")
+            finally:
+                self._ready.set()
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def collect(self):
+        with perf.collecting() as timings:
+            started = time.monotonic()
+            records, err = self._fetch()
+            snap = self._publish(records, err, started)
+        self.timings = timings
+        return snap
+
+    def _publish(self, records, err, started):
+        self.last_duration = time.monotonic() - started
+        perf.record("collect", self.last_duration)
+        self.collections += 1
+        if err:
+            self.failures += 1
+        prev = self.snapshot
+        _stamp_seen(records, prev.by_addr, time.time())
+        with perf.timer("hooks"):
+            for hook in self.hooks:
+                try:
+                    hook(records)
+                except Exception:
+                    app.logger.exception("collector hook %r failed", hook)
+        if prev.version and records == prev.records and err == prev.error:
+            # Unchanged: keep the snapshot (and anything derived from it).
+            prev.collected_at = time.time()
+            return prev
+        version = prev.version + 1
+        snap = Snapshot(version, f"{self.epoch}.{version}", time.time(), records, err)
+        self._recent.append(snap)
+        with self._changed:
+            self.snapshot = snap
+            self._changed.notify_all()
+        return snap
+
+    def start_async(self):
+        """Collect from a task on the running event loop instead of a thread."""
+        if self._pid == os.getpid() and self._task is not None:
+            return
+        self._pid = os.getpid()
+        self.epoch = secrets.token_hex(4)
+        self._recent.clear()
+        self._ready.clear()
+        self._task = asyncio.get_running_loop().create_task(self._arun())
+
+    def stop_async(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _arun(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.refresh()
+            except Exception:
+                app.logger.exception("collection failed")
+            finally:
+                self._ready.set()
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def refresh(self):
+        """Collect once without blocking the event loop.
+
+        Concurrent callers share the collection already in flight instead of
+        each querying chronyd.
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._acollect())
+            self._inflight.add_done_callback(self._collected)
+        return await asyncio.shield(self._inflight)
+
+    def _collected(self, future):
+        self._inflight = None
+
+    async def _acollect(self):
+        prev = self.snapshot
+        with perf.collecting() as timings:
+            started = time.monotonic()
+            if self._afetch is not None:
+                records, err = await self._afetch()
+            else:
+                records, err = await asyncio.to_thread(self._fetch)
+            # Hooks and the comparison with the last table take a while too.
+            snap = await asyncio.to_thread(self._publish, records, err, started)
+        self.timings = timings
+        published, self._published = self._published, None
+        if published is not None and snap is not prev:
+            published.set()
+        return snap
+
+    async def aget(self, timeout=5.0):
+        """``get`` for the event loop; early callers share the first collection
+        and, like ``get``, wait at most ``timeout`` for it."""
+        self.start_async()
+        if not self._ready.is_set():
+            try:
+                await asyncio.wait_for(self.refresh(), timeout)
+            except asyncio.TimeoutError:
+                # The collection carries on; answer with the snapshot there is.
+                return self.snapshot
+            except Exception:
+                self._ready.set()
+                raise
+            self._ready.set()
+        return self.snapshot
+
+    async def await_change(self, tag, timeout):
+        """Async ``wait``: until the snapshot tag differs from ``tag`` or ``timeout``."""
+        if self.snapshot.tag == tag:
+            if self._published is None:
+                self._published = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._published.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.snapshot
+
+    def get(self, timeout=5.0):
+        self.start()
+        self._ready.wait(timeout)
+        return self.snapshot
+
+    def wait(self, tag, timeout):
+        """Block until the snapshot tag differs from ``tag`` or ``timeout``."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.snapshot.tag != tag, timeout)
+            return self.snapshot
+
+    def find(self, tag):
+        """Return a recent snapshot by tag, or None if it is no longer kept."""
+        for snap in reversed(self._recent):
+            if snap.tag == tag:
+                return snap
+        return None
+
+
+class History:
+    """Per-client ring buffers of NTP hits and drops, one sample per ``step``.
+
+    Counters live in two ``uint32`` matrices (one row per client, one column
+    per slot) that share a single timestamp column, so rates for every client
+    come out of a few NumPy operations. With ``path`` set, the matrices are
+    memory-mapped ``.npy`` files and survive a restart without a reload.
+    """
+
+    def __init__(self, step, span, window, path=None, max_clients=200000):
+        self.step = step
+        self.slots = max(2, int(span // step))
+        self.window = window
+        self.path = path
+        self.max_clients = max_clients
+        self.rows = {}
+        self.free = []
+        self.head = -1
+        self.last_sample = 0.0
+        self._lock = threading.Lock()
+        self.times = self.ntp = self.drop = None
+        self._base = self._addrs = self._idx = None
+        if not (path and self._load()):
+            self._alloc(1024)
+            self.free = list(range(len(self.ntp) - 1, -1, -1))
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _matrix(self, name, shape, dtype, fill):
+        if self.path:
+            arr = np.lib.format.open_memmap(
+                self._file(name + ".tmp.npy"), mode="w+", dtype=dtype, shape=shape
+            )
+        else:
+            arr = np.empty(shape, dtype=dtype)
+        arr.fill(fill)
+        return arr
+
+    def _alloc(self, capacity):
+        ntp = self._matrix("ntp", (capacity, self.slots), np.uint32, NO_HIT)
+        drop = self._matrix("drop", (capacity, self.slots), np.uint32, NO_HIT)
+        times = self._matrix("times", (self.slots,), np.float64, 0.0)
+        if self.ntp is not None:
+            n = len(self.ntp)
+            ntp[:n] = self.ntp
+            drop[:n] = self.drop
+            times[:] = self.times
+        if self.path:
+            self.ntp = self.drop = self.times = None
+            for name in ("ntp", "drop", "times"):
+                os.replace(self._file(name + ".tmp.npy"), self._file(name + ".npy"))
+            ntp, drop, times = (
+                np.load(self._file(name + ".npy"), mmap_mode="r+")
+                for name in ("ntp", "drop", "times")
+            )
+        self.ntp, self.drop, self.times = ntp, drop, times
+
+    def _load(self):
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            with open(self._file("meta.json")) as f:
+                meta = json.load(f)
+            arrays = [
+                np.load(self._file(name + ".npy"), mmap_mode="r+")
+                for name in ("ntp", "drop", "times")
+            ]
+        except (OSError, ValueError):
+            return False
+        if meta.get("step") != self.step or arrays[2].shape != (self.slots,):
+            return False
+        self.ntp, self.drop, self.times = arrays
+        self.head = meta["head"]
+        self.last_sample = meta["last_sample"]
+        for row, addr in enumerate(meta["addrs"]):
+            if addr is None:
+                self.free.append(row)
+            else:
+                self.rows[addr] = row
+        return True
+
+    def _save_meta(self):
+        addrs = [None] * len(self.ntp)
+        for addr, row in self.rows.items():
+            addrs[row] = addr
+        meta = {
+            "step": self.step,
+            "head": self.head,
+            "last_sample": self.last_sample,
+            "addrs": addrs,
+        }
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        for arr in (self.ntp, self.drop, self.times):
+            arr.flush()
+        os.replace(tmp, self._file("meta.json"))
+
+    def _reclaim(self):
+        # Rows whose client has not been seen for a whole ring can be reused.
+        empty = set(np.flatnonzero((self.ntp == NO_HIT).all(axis=1)).tolist())
+        for addr in [a for a, row in self.rows.items() if row in empty]:
+            self.free.append(self.rows.pop(addr))
+
+    def _row(self, addr):
+        row = self.rows.get(addr)
+        if row is not None:
+            return row
+        if not self.free:
+            return -1
+        row = self.rows[addr] = self.free.pop()
+        return row
+
+    def _reserve(self, records):
+        new = sum(1 for r in records if r.addr not in self.rows)
+        if new <= len(self.free):
+            return
+        self._reclaim()
+        n = len(self.ntp)
+        need = n + new - len(self.free)
+        if new <= len(self.free) or n >= self.max_clients:
+            return
+        # Grow with some headroom, in 1024-row steps.
+        capacity = min(self.max_clients, (need + need // 8) // 1024 * 1024 + 1024)
+        self._alloc(capacity)
+        self.free.extend(range(capacity - 1, n - 1, -1))
+
+    def _record(self, records, now):
+        self.head = h = (self.head + 1) % self.slots
+        self.times[h] = now
+        self.ntp[:, h] = NO_HIT
+        self.drop[:, h] = NO_HIT
+        self._reserve(records)
+        idx = np.fromiter((self._row(r.addr) for r in records), np.int64, len(records))
+        keep = idx >= 0
+        ntp = np.fromiter((r.ntp_hits for r in records), np.uint32, len(records))
+        drop = np.fromiter((r.ntp_drops for r in records), np.uint32, len(records))
+        self.ntp[idx[keep], h] = ntp[keep]
+        self.drop[idx[keep], h] = drop[keep]
+        self.last_sample = now
+        if self.path:
+            self._save_meta()
+
+    def _baseline(self, rows, now, window):
+        """Oldest sample inside ``window`` for each row (NO_HIT if none)."""
+        k = min(self.slots - 1, max(1, int(round(window / self.step))))
+        cols = [(self.head - j) % self.slots for j in range(k, -1, -1)]
+        in_window = self.times[cols] >= now - window - self.step / 2
+        ntp = self.ntp[np.ix_(rows, cols)]
+        drop = self.drop[np.ix_(rows, cols)]
+        valid = (ntp != NO_HIT) & in_window
+        first = valid.argmax(axis=1)
+        pick = np.arange(len(rows))
+        has = valid[pick, first]
+        times = self.times[cols][first]
+        return has, times, ntp[pick, first], drop[pick, first]
+
+    def annotate(self, records):
+        """Sample ``records`` every ``step`` seconds and set their rate-based
+        severity from the drops seen within ``window``."""
+        now = time.time()
+        with self._lock:
+            if now - self.last_sample >= self.step:
+                self._record(records, now)
+                self._base = None
+            if self._base is None:
+                # Baselines only move when a sample is recorded.
+                rows = np.arange(len(self.ntp))
+                has, _, _, drop = self._baseline(rows, now, self.window)
+                self._base = np.where(has, drop, 0).astype(np.int64)
+                self._addrs = None
+            addrs = [r.addr for r in records]
+            if addrs != self._addrs:
+                self._addrs = addrs
+                self._idx = np.fromiter(
+                    (self.rows.get(a, -1) for a in addrs), np.int64, len(addrs)
+                )
+            idx = self._idx
+            base = np.where(idx >= 0, self._base[idx], 0)
+        current = np.fromiter((r.ntp_drops for r in records), np.int64, len(records))
+        drops = current - base
+        # A counter that went backwards means chronyd restarted.
+        drops = np.where(drops < 0, current, drops)
+        sev = np.where(drops >= 10, 2, np.where(drops > 0, 1, 0))
+        for rec, s, d in zip(records, sev.tolist(), drops.tolist()):
+            rec.sev = s
+            rec.recent_drops = d
+
+    def series(self, addr, window=None):
+        """Samples and NTP/drop rates (per second over ``window``) for a client."""
+        window = window or self.window
+        now = time.time()
+        with self._lock:
+            row = self.rows.get(addr)
+            if row is None or self.head < 0:
+                return None
+            order = [(self.head + 1 + j) % self.slots for j in range(self.slots)]
+            times = self.times[order]
+            ntp = self.ntp[row, order]
+            drop = self.drop[row, order]
+            has, t0, ntp0, drop0 = self._baseline(np.array([row]), now, window)
+        valid = ntp != NO_HIT
+        samples = [
+            [t, n, d]
+            for t, n, d in zip(
+                times[valid].tolist(), ntp[valid].tolist(), drop[valid].tolist()
+            )
+        ]
+        ntp_rate = drop_rate = None
+        if has[0] and samples and samples[-1][0] > t0[0]:
+            t1, n1, d1 = samples[-1]
+            span = t1 - float(t0[0])
+            ntp_rate = max(0, n1 - int(ntp0[0])) / span
+            drop_rate = max(0, d1 - int(drop0[0])) / span
+        return {
+            "addr": addr,
+            "step": self.step,
+            "window": window,
+            "ntp_rate": ntp_rate,
+            "drop_rate": drop_rate,
+            "samples": samples,
+        }
+
+
+fleet = Fleet.from_file(SERVERS_FILE) if SERVERS_FILE else None
+if fleet is not None:
+    # Fleet fetches already run in a thread pool with per-endpoint timeouts.
+    collector = Collector(fleet.collect, COLLECT_INTERVAL)
+else:
+    collector = Collector(collect_clients, COLLECT_INTERVAL, acollect_clients)
+history = None
+if np is not None and HISTORY_SPAN > 0:
+    history = History(HISTORY_STEP, HISTORY_SPAN, RATE_WINDOW, HISTORY_DIR)
+    collector.hooks.append(history.annotate)
+resolver = None
+if RESOLVE_WORKERS > 0:
+    resolver = Resolver(
+        RESOLVE_WORKERS,
+        RESOLVE_TTL,
+        RESOLVE_NEGATIVE_TTL,
+        RESOLVE_TIMEOUT,
+        RESOLVE_CACHE,
+    )
+    collector.hooks.append(resolver.annotate)
+
+
+View = collections.namedtuple("View", "q sort offset limit")
+
+
+def _parse_view(args):
+    """Server-side filter/sort/page parameters, or None for the full table."""
+    if not any(k in args for k in ("q", "sort", "offset", "limit")):
+        return None
+    sort = args.get("sort") or "ip_order"
+    if sort not in SORT_MODES:
+        raise ValueError(f"sort must be one of {', '.join(SORT_MODES)}")
+    offset = int(args.get("offset") or 0)
+    limit = int(args.get("limit") or PAGE_LIMIT)
+    if offset < 0 or limit < 1:
+        raise ValueError("offset must be >= 0 and limit >= 1")
+    q = (args.get("q") or "").strip().lower()
+    return View(q, sort, offset, min(limit, PAGE_LIMIT_MAX))
+
+
+def _page(snap, view):
+    positions, counts = snapshot_index(snap).query(view.q, view.sort)
+    recs = snap.records
+    page = [recs[i].to_row() for i in positions[view.offset : view.offset + view.limit]]
+    return len(positions), counts, page
+
+
+def _known_since(since):
+    """``since`` if the collector still keeps that version, else None.
+
+    Only versions that can answer with a delta end up in cache keys, so
+    made-up ``since`` values cannot add entries to a snapshot.
+    """
+    return since if since and collector.find(since) is not None else None
+
+
+def _snapshot_payload(snap, since=None, view=None):
+    """Payload for a snapshot: one page of ``view``, a delta since ``since``
+    (when that version is still known) or the full table."""
+    payload = {"count": snap.count, "version": snap.tag}
+    base = collector.find(since) if since and view is None else None
+    if view is not None:
+        total, counts, page = _page(snap, view)
+        payload.update(
+            total=total,
+            severity=counts,
+            q=view.q,
+            sort=view.sort,
+            offset=view.offset,
+            limit=view.limit,
+            clients_parsed=page,
+        )
+    elif base is not None:
+        added, removed, changed = snapshot_delta(base, snap)
+        payload.update(
+            delta=True, since=since, added=added, removed=removed, changed=changed
+        )
+    else:
+        payload["clients_parsed"] = snap.clients
+    if snap.error:
+        payload["error"] = snap.error
+    return payload
+
+
+def _live_fields():
+    """Payload fields that change between requests for the same version."""
+    fields = {"local_time": get_local_time(), "server_time": round(time.time(), 3)}
+    if fleet is not None:
+        fields["servers"] = fleet.status()
+    return fields
+
+
+DATA_FORMATS = ("json", "columns", "msgpack")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+ROW_FIELDS = ("addr", "NTP", "Drop", "Int", "IntL", "Seen", "Cmd", "sev")
+
+
+def _parse_format(args, accept):
+    """``format`` parameter, else MessagePack if the Accept header prefers it."""
+    fmt = args.get("format")
+    if fmt is None:
+        best = accept.best_match(("application/json",) + MSGPACK_TYPES)
+        return "msgpack" if best in MSGPACK_TYPES and msgpack is not None else "json"
+    if fmt not in DATA_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(DATA_FORMATS)}")
+    return fmt
+
+
+def _dumps(obj):
+    """Compact JSON as bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def _columns(rows):
+    """One array per field instead of one object per row."""
+    cols = {key: [row[key] for row in rows] for key in ROW_FIELDS}
+    if any("servers" in row for row in rows):
+        cols["servers"] = [row.get("servers") for row in rows]
+    if any("hostname" in row for row in rows):
+        cols["hostname"] = [row.get("hostname") for row in rows]
+    return cols
+
+
+def _data_since(since, view):
+    # Views ignore since; made-up versions must not key cache entries.
+    return None if view is not None else _known_since(since)
+
+
+def _data_body(snap, since, view, fmt):
+    """Encoded ``/data`` body without the live fields, shared per version."""
+
+    def build():
+        payload = _snapshot_payload(snap, since, view)
+        if fmt == "json":
+            return _dumps(payload)
+        payload["layout"] = "columns"
+        for key in ("clients_parsed", "added", "changed"):
+            if key in payload:
+                payload[key] = _columns(payload[key])
+        if fmt == "msgpack":
+            return msgpack.packb(payload)
+        return _dumps(payload)
+
+    return snap.cached(("data", since, view, fmt), build, bounded=view is not None)
+
+
+def _data_deflated(snap, since, view, fmt):
+    """Raw deflate of the cached body minus its first byte (the map opener),
+    sync-flushed so that it can follow a separately compressed prefix."""
+
+    def build():
+        comp = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        body = memoryview(_data_body(snap, since, view, fmt))[1:]
+        return comp.compress(body) + comp.flush(zlib.Z_SYNC_FLUSH)
+
+    return snap.cached(
+        ("data.deflate", since, view, fmt), build, bounded=view is not None
+    )
+
+
+def _live_prefix(body, fmt):
+    """Bytes that open the object and hold the live fields; ``body[1:]``
+    follows them."""
+    live = _live_fields()
+    if fmt == "msgpack":
+        # Both maps are fixmaps (< 16 keys): merge the counts in the header.
+        head = msgpack.packb(live)
+        return bytes([body[0] + len(live)]) + head[1:]
+    return _dumps(live)[:-1] + b","
+
+
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def _data_response(snap, since, view, fmt):
+    """``/data`` response built from the cached encodings of the snapshot.
+
+    Only the small live prefix is encoded per request. Gzip bodies splice
+    its deflate stream in front of the cached one, so compressing a large
+    table happens once per version too.
+    """
+    since = _data_since(since, view)
+    with perf.timer("encode"):
+        body = _data_body(snap, since, view, fmt)
+        prefix = _live_prefix(body, fmt)
+    mimetype = MSGPACK_TYPES[0] if fmt == "msgpack" else "application/json"
+    if len(body) < GZIP_MIN_SIZE or request.accept_encodings.quality("gzip") <= 0:
+        return app.response_class(
+            b"".join((prefix, memoryview(body)[1:])), mimetype=mimetype
+        )
+    with perf.timer("compress"):
+        comp = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        head = comp.compress(prefix) + comp.flush(zlib.Z_SYNC_FLUSH)
+        rest = memoryview(body)[1:]
+        trailer = struct.pack(
+            "<II",
+            zlib.crc32(rest, zlib.crc32(prefix)),
+            (len(prefix) + len(rest)) & 0xFFFFFFFF,
+        )
+        gz = b"".join(
+            (
+                _GZIP_HEADER,
+                head,
+                _data_deflated(snap, since, view, fmt),
+                comp.flush(),
+                trailer,
+            )
+        )
+    resp = app.response_class(gz, mimetype=mimetype)
+    resp.headers["Content-Encoding"] = "gzip"
+    return resp
+
+
+def _bad_request(e):
+    return jsonify({"error": str(e)}), 400
+
+
+def _queue_time():
+    """Seconds since a proxy's ``X-Request-Start: t=<epoch>`` (s, ms or us)."""
+    value = request.headers.get("X-Request-Start", "")
+    try:
+        start = float(value[2:] if value.startswith("t=") else value)
+    except ValueError:
+        return None
+    while start > 1e11:
+        start /= 1000.0
+    queued = time.time() - start
+    return queued if 0 <= queued < 3600 else None
+
+
+# Collection stages reported on /data, in pipeline order.
+_COLLECT_STAGES = ("chronyc", "socket", "parse", "sort", "collect", "hooks")
+
+
+def _server_timing(request_timings, snap):
+    """``Server-Timing`` value: the last collection's stages, then this request's."""
+    parts = [
+        f"{stage};dur={collector.timings[stage] * 1000:.2f}"
+        for stage in _COLLECT_STAGES
+        if stage in collector.timings
+    ]
+    parts += [
+        f"{stage};dur={seconds * 1000:.2f}"
+        for stage, seconds in request_timings.items()
+    ]
+    age = max(0.0, time.time() - snap.collected_at) if snap.collected_at else 0.0
+    parts.append(f'age;dur={age * 1000:.0f};desc="snapshot age"')
+    return ", ".join(parts)
+
+
 @app.route("/data")
 def data():
-    parsed, count, err = get_chrony_clients()
-    payload = {
-        "clients_parsed": parsed,
-        "count": count,
-        "local_time": get_local_time(),
-    }
-    if err:
-        payload["error"] = err
-    return jsonify(payload)
+    try:
+        view = _parse_view(request.args)
+        fmt = _parse_format(request.args, request.accept_mimetypes)
+    except ValueError as e:
+        return _bad_request(e)
+    if fmt == "msgpack" and msgpack is None:
+        return jsonify({"error": "format msgpack requires the msgpack module"}), 406
+    started = time.perf_counter()
+    with perf.collecting() as timings:
+        queued = _queue_time()
+        if queued is not None:
+            perf.record("queue", queued)
+        snap = collector.get()
+        if request.if_none_match.contains_weak(snap.tag):
+            resp = app.response_class(status=304)
+        else:
+            resp = _data_response(snap, request.args.get("since"), view, fmt)
+        perf.record("data", time.perf_counter() - started)
+    resp.set_etag(snap.tag, weak=True)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["Server-Timing"] = _server_timing(timings, snap)
+    resp.vary.update(("Accept", "Accept-Encoding"))
+    return resp
 
 
-@app.route("/")
-def dashboard():
-    html = """
-    <!DOCTYPE html>
-    <html lang="en" data-bs-theme="dark">
-    <head>
-        <meta charset="UTF-8"/>
-        <meta name="viewport" content="width=device-width, initial-scale=1"/>
-        <title>TICC-DASH | Time Information of Chrony Clients – Dashboard</title>
+def _sse_live(head, rest):
+    """An event from its cached parts, with the live fields put in front
+    (as ``_live_prefix`` does for ``/data``)."""
+    live = _dumps(_live_fields())[:-1].decode()
+    return f"{head}{live},{rest}\n\n"
+
+
+def _sse_event(snap, since):
+    # Every viewer on the same version shares the encoded snapshot part.
+    since = _known_since(since)
+
+    def build():
+        payload = _snapshot_payload(snap, since)
+        kind = "delta" if payload.get("delta") else "snapshot"
+        body = _dumps(payload).decode()
+        return f"id: {snap.tag}\nevent: {kind}\ndata: ", body[1:]
+
+    return _sse_live(*snap.cached(("sse", since), build))
+
+
+def _sse_page(snap, view):
+    """``(content key, event)`` for one page; the key skips unchanged pages."""
+
+    def build():
+        payload = _snapshot_payload(snap, view=view)
+        key = (payload["total"], payload["severity"], payload["clients_parsed"])
+        body = _dumps(payload).decode()
+        return key, f"id: {snap.tag}\nevent: page\ndata: ", body[1:]
+
+    key, head, rest = snap.cached(("page", view), build, bounded=True)
+    return key, _sse_live(head, rest)
+
+
+def _sse_cached(snap, view, since):
+    """Whether ``_sse_next`` only has to read cached encodings."""
+    if snap.tag == since:
+        return True
+    if view is None:
+        return snap.peek(("sse", _known_since(since))) is not None
+    return snap.peek(("page", view)) is not None
+
+
+def _sse_next(snap, view, since, last):
+    """Next event of a stream that has sent ``since`` (and, for a view, a page
+    with content key ``last``): ``(event or "", since, last)``."""
+    if snap.tag == since:
+        return "", since, last
+    if view is None:
+        return _sse_event(snap, since), snap.tag, last
+    key, event = _sse_page(snap, view)
+    return (event if key != last else ""), snap.tag, key
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metric(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        if labels:
+            pairs = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{pairs}}} {value}")
+        else:
+            lines.append(f"{name} {value}")
+
+
+def _snapshot_metrics(snap, top):
+    """Prometheus text for everything derived from the snapshot itself."""
+    recs = snap.records
+    counts = snapshot_index(snap).totals
+    lines = []
+    _metric(
+        lines,
+        "ticc_dash_clients",
+        "gauge",
+        "Clients in the snapshot.",
+        [({}, len(recs))],
+    )
+    _metric(
+        lines,
+        "ticc_dash_clients_by_severity",
+        "gauge",
+        "Clients per status.",
+        [({"severity": k}, v) for k, v in counts.items()],
+    )
+    _metric(
+        lines,
+        "ticc_dash_ntp_packets",
+        "gauge",
+        "NTP packets received from all current clients.",
+        [({}, sum(r.ntp_hits for r in recs))],
+    )
+    _metric(
+        lines,
+        "ticc_dash_ntp_drops",
+        "gauge",
+        "NTP packets dropped for all current clients.",
+        [({}, sum(r.ntp_drops for r in recs))],
+    )
+    _metric(
+        lines,
+        "ticc_dash_cmd_packets",
+        "gauge",
+        "Command packets received from all current clients.",
+        [({}, sum(r.cmd_hits for r in recs))],
+    )
+    if top > 0:
+        # Worst clients first: drops within the rate window when history is
+        # kept, otherwise drops since chronyd started.
+        worst = heapq.nlargest(
+            top,
+            recs,
+            key=lambda r: r.ntp_drops if r.recent_drops is None else r.recent_drops,
+        )
+        _metric(
+            lines,
+            "ticc_dash_client_ntp_packets",
+            "gauge",
+            "NTP packets received from the client.",
+            [({"addr": r.addr}, r.ntp_hits) for r in worst],
+        )
+        _metric(
+            lines,
+            "ticc_dash_client_ntp_drops",
+            "gauge",
+            "NTP packets dropped for the client.",
+            [({"addr": r.addr}, r.ntp_drops) for r in worst],
+        )
+        if history is not None:
+            _metric(
+                lines,
+                "ticc_dash_client_drop_rate",
+                "gauge",
+                "Dropped NTP packets per second over the rate window.",
+                [
+                    ({"addr": r.addr}, (r.recent_drops or 0) / history.window)
+                    for r in worst
+                ],
+            )
+    return "\n".join(lines) + "\n"
+
+
+def render_metrics(snap, top=0):
+    # Other ?clients= values than the configured one share the bounded cache.
+    text = snap.cached(
+        ("metrics", top),
+        lambda: _snapshot_metrics(snap, top),
+        bounded=top != METRICS_CLIENTS,
+    )
+    lines = []
+    _metric(
+        lines,
+        "ticc_dash_collections_total",
+        "counter",
+        "Collections run by this process.",
+        [({}, collector.collections)],
+    )
+    _metric(
+        lines,
+        "ticc_dash_collection_errors_total",
+        "counter",
+        "Collections that reported an error.",
+        [({}, collector.failures)],
+    )
+    _metric(
+        lines,
+        "ticc_dash_collect_duration_seconds",
+        "gauge",
+        "Duration of the last collection.",
+        [({}, collector.last_duration)],
+    )
+    _metric(
+        lines,
+        "ticc_dash_snapshot_age_seconds",
+        "gauge",
+        "Seconds since the snapshot was last confirmed.",
+        [({}, max(0.0, time.time() - snap.collected_at))],
+    )
+    if fleet is not None:
+        status = fleet.status()
+        _metric(
+            lines,
+            "ticc_dash_server_up",
+            "gauge",
+            "Whether the last fetch from the server succeeded.",
+            [({"server": s["name"]}, int(not s["stale"])) for s in status],
+        )
+        _metric(
+            lines,
+            "ticc_dash_server_clients",
+            "gauge",
+            "Clients reported by the server.",
+            [({"server": s["name"]}, s["count"]) for s in status],
+        )
+        _metric(
+            lines,
+            "ticc_dash_server_fetch_duration_seconds",
+            "gauge",
+            "Duration of the last fetch from the server.",
+            [({"server": s["name"]}, s["duration"] or 0) for s in status],
+        )
+    return text + "\n".join(lines) + "\n"
+
+
+@app.route("/metrics")
+def metrics():
+    snap = collector.get()
+    try:
+        top = int(request.args.get("clients", METRICS_CLIENTS))
+    except ValueError as e:
+        return _bad_request(e)
+    top = max(0, min(top, METRICS_CLIENTS_MAX))
+    return app.response_class(
+        render_metrics(snap, top), mimetype="text/plain; version=0.0.4"
+    )
+
+
+@app.route("/debug/perf")
+def debug_perf():
+    snap = collector.snapshot
+    summary = perf.summary()
+    summary.update(
+        uptime=round(time.time() - perf.started, 1),
+        snapshot={
+            "version": snap.tag,
+            "count": snap.count,
+            "age": (
+                round(time.time() - snap.collected_at, 3) if snap.collected_at else None
+            ),
+            "error": snap.error or None,
+        },
+        collector={
+            "interval": collector.interval,
+            "collections": collector.collections,
+            "failures": collector.failures,
+            "last_duration_ms": round(collector.last_duration * 1000, 3),
+            "last_timings_ms": {
+                stage: round(seconds * 1000, 3)
+                for stage, seconds in collector.timings.items()
+            },
+        },
+        resolver=resolver.status() if resolver is not None else None,
+        profiler={"enabled": PROFILER_ENABLED, "running": sampler.running},
+    )
+    resp = jsonify(summary)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
 
-        <!-- Favicons -->
-        <link rel="icon" type="image/png" href="/static/img/favicon.png"/>
-        <link rel="icon" type="image/png" href="/static/img/ticc-dash-logo.png"/>
+@app.route("/debug/profile")
+def debug_profile():
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "profiler is disabled (TICC_DASH_PROFILER=1)"}), 404
+    try:
+        seconds = float(request.args.get("seconds") or 10)
+        interval = float(request.args.get("interval") or 0.01)
+    except ValueError as e:
+        return _bad_request(e)
+    if not (0 < seconds <= PROFILE_MAX_SECONDS and 0.001 <= interval <= 1):
+        return _bad_request(
+            f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}], interval in [0.001, 1]"
+        )
+    stacks = sampler.capture(seconds, interval)
+    if stacks is None:
+        return jsonify({"error": "a profile is already being captured"}), 409
+    return app.response_class(stacks, mimetype="text/plain")
+
+
+def _parse_window(args):
+    """``window`` in seconds, or None for the configured RATE_WINDOW."""
+    if not args.get("window"):
+        return None
+    window = float(args["window"])
+    # nan and inf pass float() but cannot size a baseline.
+    if not (math.isfinite(window) and window > 0):
+        raise ValueError("window must be a positive number of seconds")
+    return window
+
+
+@app.route("/history")
+def client_history():
+    if history is None:
+        return jsonify({"error": "history is disabled (requires numpy)"}), 503
+    addr = request.args.get("addr", "")
+    try:
+        window = _parse_window(request.args)
+    except ValueError as e:
+        return _bad_request(e)
+    series = history.series(addr, window)
+    if series is None:
+        return jsonify({"error": f"no history for {addr!r}"}), 404
+    return jsonify(series)
+
+
+@app.route("/stream")
+def stream():
+    try:
+        view = _parse_view(request.args)
+    except ValueError as e:
+        return _bad_request(e)
+    collector.get()
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+
+    def events(since):
+        yield "retry: 3000\n\n"
+        snap = collector.snapshot
+        last = None
+        while True:
+            event, since, last = _sse_next(snap, view, since, last)
+            if event:
+                yield event
+            snap = collector.wait(since, STREAM_HEARTBEAT)
+            if snap.tag == since:
+                yield ": keepalive\n\n"
+
+    resp = app.response_class(events(since), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    # Don't let a reverse proxy (nginx) buffer the stream.
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_FIELDS = (
+    "addr",
+    "hostname",
+    "severity",
+    "ntp_hits",
+    "ntp_drops",
+    "recent_drops",
+    "ntp_interval",
+    "ntp_timeout_interval",
+    "seen_ntp",
+    "cmd_hits",
+    "cmd_drops",
+    "cmd_interval",
+    "seen_cmd",
+    "servers",
+)
+# Rows encoded (and compressed) per chunk of an /export body.
+EXPORT_CHUNK = 1000
+
+
+def _export_filter(args):
+    """Row predicate from ``severity``, ``addr`` (prefix or CIDR) and
+    ``min_drops``, or None when nothing is filtered out."""
+    tests = []
+    if args.get("severity"):
+        names = args["severity"].split(",")
+        if not set(names) <= set(SEVERITY_NAMES):
+            raise ValueError(f"severity must be one of {', '.join(SEVERITY_NAMES)}")
+        wanted = {SEVERITY_NAMES.index(name) for name in names}
+        tests.append(lambda rec: rec.severity in wanted)
+    addr = (args.get("addr") or "").strip().lower()
+    if "/" in addr:
+        net = ipaddress.ip_network(addr, strict=False)
+        # Sort keys are the packed addresses, so a network is a range of keys.
+        family = b"\x04" if net.version == 4 else b"\x06"
+        lo = family + net.network_address.packed
+        hi = family + net.broadcast_address.packed
+        tests.append(lambda rec: lo <= rec.sort_key <= hi)
+    elif addr:
+        tests.append(lambda rec: rec.addr.startswith(addr))
+    if args.get("min_drops"):
+        min_drops = int(args["min_drops"])
+        tests.append(lambda rec: rec.ntp_drops >= min_drops)
+    if not tests:
+        return None
+    return lambda rec: all(test(rec) for test in tests)
+
+
+def _export_values(rec):
+    def rate(r):
+        return None if r == INVALID_RATE else r
+
+    return (
+        rec.addr,
+        rec.hostname,
+        SEVERITY_NAMES[rec.severity],
+        rec.ntp_hits,
+        rec.ntp_drops,
+        rec.recent_drops,
+        rate(rec.ntp_interval),
+        rate(rec.ntp_timeout_interval),
+        rec.seen_ntp,
+        rec.cmd_hits,
+        rec.cmd_drops,
+        rate(rec.cmd_interval),
+        rec.seen_cmd,
+        list(rec.servers) or None,
+    )
+
+
+def _export_batches(records, keep):
+    batch = []
+    for rec in records:
+        if keep is None or keep(rec):
+            batch.append(rec)
+            if len(batch) == EXPORT_CHUNK:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _export_csv(records, keep):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    yield (",".join(EXPORT_FIELDS) + "\n").encode()
+    for batch in _export_batches(records, keep):
+        for rec in batch:
+            values = _export_values(rec)
+            servers = values[-1]
+            writer.writerow(values[:-1] + (" ".join(servers) if servers else None,))
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+
+
+def _export_ndjson(records, keep, with_history):
+    for batch in _export_batches(records, keep):
+        lines = []
+        for rec in batch:
+            row = dict(zip(EXPORT_FIELDS, _export_values(rec)))
+            if with_history:
+                series = history.series(rec.addr) or {}
+                row["ntp_rate"] = series.get("ntp_rate")
+                row["drop_rate"] = series.get("drop_rate")
+                row["samples"] = series.get("samples", [])
+            lines.append(_dumps(row))
+        lines.append(b"")
+        yield b"\n".join(lines)
+
+
+def _gzip_chunks(chunks):
+    # Flushed per chunk, so every chunk is sent as soon as it is encoded.
+    comp = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield comp.compress(chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+    yield comp.flush()
+
+
+@app.route("/export.<fmt>")
+def export(fmt):
+    """The whole client table (or the rows matching the filters) as CSV or
+    NDJSON, streamed from the current snapshot in chunks of EXPORT_CHUNK rows."""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    try:
+        keep = _export_filter(request.args)
+    except ValueError as e:
+        return _bad_request(e)
+    with_history = request.args.get("history") == "1"
+    if with_history and fmt != "ndjson":
+        return _bad_request("history is only exported as NDJSON")
+    if with_history and history is None:
+        return jsonify({"error": "history is disabled (requires numpy)"}), 503
+    snap = collector.get()
+    if fmt == "csv":
+        chunks = _export_csv(snap.records, keep)
+        mimetype = "text/csv"
+    else:
+        chunks = _export_ndjson(snap.records, keep, with_history)
+        mimetype = "application/x-ndjson"
+    gzipped = request.accept_encodings.quality("gzip") > 0
+    resp = app.response_class(
+        _gzip_chunks(chunks) if gzipped else chunks, mimetype=mimetype
+    )
+    if gzipped:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Content-Disposition"] = (
+        f'attachment; filename="ticc-dash-clients-{snap.tag}.{fmt}"'
+    )
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Accel-Buffering"] = "no"
+    resp.vary.add("Accept-Encoding")
+    return resp
 
-        <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css"/>
-        <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-        <style>
+
+DASHBOARD_CSS = """
             :root{
                 --ok:#198754; --warn:#ffc107; --bad:#dc3545;
                 --bg:#0f1720; --card:#1f2630; --text-dim:#9aa3ad;
@@ -123,17 +2496,30 @@ def dashboard():
                 --toolbar-border: rgba(255,255,255,.12);
                 --pill-bg: rgba(255,255,255,.04); --pill-border: rgba(255,255,255,.08);
                 --info-bg: #0ea5e9; --info-btn-size: 22px;
+                --fg:#dee2e6; --input-bg:#212529; --hover-bg: rgba(255,255,255,.075); --accent:#0d6efd;
+                color-scheme: dark;
             }
-            html[data-bs-theme="light"]{
+            html[data-theme="light"]{
                 --bg:#eef2f3; --card:#ffffff; --text-dim:#475569;
                 --border: rgba(0,0,0,.12); --row-sep: rgba(0,0,0,.06);
                 --tile-bg: rgba(0,0,0,0.06); --detail-bg: rgba(0,0,0,0.03);
                 --title-color:#2c7a7b; --toolbar-bg: rgba(255,255,255,.85);
                 --toolbar-border: rgba(0,0,0,.12); --pill-bg: rgba(0,0,0,.03);
                 --pill-border: rgba(0,0,0,.08); --info-bg: #0284c7;
+                --fg:#212529; --input-bg:#ffffff; --hover-bg: rgba(0,0,0,.075);
+                color-scheme: light;
             }
 
-            body { font-family: system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif; background: var(--bg); }
+            *, *::before, *::after{ box-sizing: border-box; }
+            body { margin:0; font-family: system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif; font-size:1rem; line-height:1.5; color: var(--fg); background: var(--bg); }
+            .text-center{ text-align:center !important; } .text-end{ text-align:right !important; }
+            .badge{ display:inline-block; font-size:.75em; font-weight:700; line-height:1; color:#fff; white-space:nowrap; border-radius:.375rem; padding:.35em .65em; background: var(--accent); }
+            .form-select, .form-control{ display:block; font:inherit; line-height:1.5; padding:.375rem .75rem; color: var(--fg); background: var(--input-bg);
+                border: 1px solid var(--border); border-radius:.375rem; }
+            .form-select:focus, .form-control:focus{ outline:0; border-color:#86b7fe; box-shadow: 0 0 0 .25rem rgba(13,110,253,.25); }
+            .table{ width:100%; margin-bottom:1rem; color:inherit; border-color: var(--border); }
+            .table th{ text-align:left; vertical-align: middle; } .table td{ vertical-align: middle; }
+            .table tbody tr.client-row:hover > td{ background: var(--hover-bg); }
             .page { max-width: 1100px; margin: 0 auto; padding: 12px 16px 28px; }
 
             /* Brand header with logo + centered title */
@@ -188,6 +2574,7 @@ def dashboard():
 
             .controls{ display:flex; gap:8px; justify-content:center; align-items:center; flex-wrap:wrap; margin-top: 6px; margin-bottom: 10px; }
             .controls .form-select { width: 260px; } .controls .form-control { width: min(420px, 58vw); }
+            .pager{ display:flex; gap:12px; justify-content:center; align-items:center; margin-top: 12px; color: var(--text-dim); font-variant-numeric: tabular-nums; }
 
             .table-wrap{ padding: 0; }
             .client-table{ font-size:.95rem; border-collapse: separate; border-spacing: 0; border-radius: 12px; overflow:hidden; background: var(--card);
@@ -196,8 +2583,13 @@ def dashboard():
             .client-table tbody td{ border-top: 1px solid var(--row-sep); }
             .client-table tbody tr td, .client-table thead th{ padding: .48rem .6rem; }
             .addr-cell{ font-weight:700; white-space:nowrap; overflow:hidden; text-overflow:ellipsis; }
+            .addr-cell .host{ font-weight:400; color: var(--text-dim); margin-left:.6em; }
             .td-num{ text-align:right; font-variant-numeric: tabular-nums; white-space:nowrap; }
             .last-cell{ white-space:nowrap; }
+            .client-row td{ white-space:nowrap; }
+            .client-table tbody tr.vpad td{ padding:0; border:0; }
+            /* renderWindow keeps the scroll position itself (keepAnchor) */
+            .client-table tbody{ overflow-anchor:none; }
             .caret-cell{ width:30px; text-align:center; cursor:pointer; } .caret{ user-select:none; }
             .sev-0{ border-left: 6px solid var(--ok); } .sev-1{ border-left: 6px solid var(--warn); } .sev-2{ border-left: 6px solid var(--bad); }
             .detail-row td{ padding: .75rem .6rem; background: var(--detail-bg); }
@@ -207,7 +2599,270 @@ def dashboard():
             .metric{ border-radius:10px; background: var(--tile-bg); padding:10px 12px; display:flex; align-items:center; justify-content:space-between; min-height:56px; gap:10px; }
             .metric .label{ font-weight:600; display:flex; align-items:center; gap:8px; opacity:.95; }
             .metric .value{ font-variant-numeric: tabular-nums; font-weight:600; }
-        </style>
+"""
+
+DASHBOARD_JS = """
+            function el(id){ return document.getElementById(id); }
+            function setText(id, v){ el(id).textContent=v; }
+            function applyTheme(theme){
+                document.documentElement.dataset.theme=theme;
+                el("theme-toggle").checked = theme === "dark";
+            }
+            const THEME_KEY="ticc_dash_theme", OPEN_KEY="ticc_dash_open_rows", ALL_KEY="ticc_dash_all_open";
+            const savedTheme=localStorage.getItem(THEME_KEY)||"dark"; applyTheme(savedTheme);
+            el("theme-toggle").addEventListener("change", function(){ const t=this.checked?"dark":"light"; localStorage.setItem(THEME_KEY,t); applyTheme(t); });
+
+            const infoBtn=document.getElementById("infoBtn"), infoPop=document.getElementById("infoPop");
+            infoBtn.addEventListener("click",(e)=>{e.stopPropagation(); infoPop.style.display = infoPop.style.display==="block"?"none":"block";});
+            document.addEventListener("click",(e)=>{ if(!infoPop.contains(e.target) && e.target!==infoBtn){ infoPop.style.display="none"; } });
+
+            function toInt(v){ const n=parseInt(v,10); return isNaN(n)?0:n; }
+            // Rows carry when a client was last seen (Unix time); the age is counted on the server's clock.
+            let serverSkew=0;
+            function humanSeen(seen){ if(seen===null||seen===undefined) return "-"; const sec=Math.max(0,(Date.now()+serverSkew)/1000-seen); if(sec<60) return Math.floor(sec)+" sec ago"; const m=Math.floor(sec/60); if(m<60) return m+" min ago"; const h=Math.floor(m/60); if(h<24) return h+" hr ago"; return Math.floor(h/24)+" d ago"; }
+            function severity(r){ if(r.sev!==undefined) return r.sev; const d=toInt(r.Drop); if(d>=10) return 2; if(d>0) return 1; return 0; }
+            function sevLabel(s){ return s===2?"Critical":(s===1?"Warning":"OK"); }
+            // Hostnames come from whoever controls the reverse zone.
+            function escapeHTML(t){ return String(t).replace(/[&<>"']/g, c=>"&#"+c.charCodeAt(0)+";"); }
+            function iconForAddr(a){ if(/^\\d+\\.\\d+\\.\\d+\\.\\d+$/.test(a)) return "🌐"; if(/^[0-9a-fA-F:]+$/.test(a)) return "🔗"; return "💻"; }
+
+            function loadOpenSet(){ try{ return new Set(JSON.parse(localStorage.getItem(OPEN_KEY)||"[]")); }catch(e){ return new Set(); } }
+            function saveOpenSet(s){ try{ localStorage.setItem(OPEN_KEY, JSON.stringify([...s])); }catch(e){} }
+            // Expand-all opens every matching row, also the ones not loaded yet; closedSet holds the exceptions.
+            let openSet=loadOpenSet(), allOpen=localStorage.getItem(ALL_KEY)==="1", closedSet=new Set();
+            function isOpen(addr){ return allOpen ? !closedSet.has(addr) : openSet.has(addr); }
+
+            function updateSummary(c){ setText("count-ok", c.ok||0); setText("count-warn", c.warning||0); setText("count-bad", c.critical||0); }
+
+            function detailHTML(r){ return `
+                <tr class="detail-row" data-detail-for="${r.addr}"><td></td><td colspan="7">
+                    <div class="metrics">
+                        <div class="metric"><div class="label">🕙 NTP Packets</div><div class="value">${r.NTP||"-"}</div></div>
+                        <div class="metric"><div class="label">📉 Dropped Packets</div><div class="value">${r.Drop||"-"}</div></div>
+                        <div class="metric"><div class="label">📨 Command Packets</div><div class="value">${r.Cmd||"-"}</div></div>
+                        <div class="metric"><div class="label">🔄 Interval</div><div class="value">${r.Int||"-"}</div></div>
+                        <div class="metric"><div class="label">👁️ Last Seen</div><div class="value seen">${humanSeen(r.Seen)}</div></div>
+                        <div class="metric"><div class="label">📈 NTP Rate</div><div class="value rate-ntp">${fmtRate((rates.get(r.addr)||{}).ntp_rate)}</div></div>
+                        <div class="metric"><div class="label">⚠️ Drop Rate</div><div class="value rate-drop">${fmtRate((rates.get(r.addr)||{}).drop_rate)}</div></div>
+                        ${r.hostname?`<div class="metric"><div class="label">🏷️ Hostname</div><div class="value">${escapeHTML(r.hostname)}</div></div>`:""}
+                        ${r.servers?`<div class="metric"><div class="label">🖥️ Seen by</div><div class="value">${r.servers.join(", ")}</div></div>`:""}
+                    </div>
+                </td></tr>`; }
+            // Per-client packet rates from /history, fetched when an expanded row is rendered.
+            const rates=new Map(), ratesPending=new Set();
+            function fmtRate(v){ if(v===null||v===undefined) return "-"; const m=v*60; return (m<10?m.toFixed(2):Math.round(m))+" /min"; }
+            function loadRates(addr){
+                if(ratesPending.has(addr)) return; ratesPending.add(addr);
+                fetch("/history?"+new URLSearchParams({addr:addr})).then(r=>r.ok?r.json():Promise.reject(r)).then(function(h){
+                    rates.set(addr,h); const e=rowEls.get(addr); if(!e || !e.detail) return;
+                    e.detail.querySelector(".rate-ntp").textContent=fmtRate(h.ntp_rate); e.detail.querySelector(".rate-drop").textContent=fmtRate(h.drop_rate);
+                }, ()=>{}).then(()=>ratesPending.delete(addr));
+            }
+
+            // Rows are keyed by address and patched in place. Only the rows around the viewport are
+            // in the table; two padding rows stand in for the rest so the scrollbar covers all matches.
+            const FETCH_ROWS=200, WINDOW_STEP=50, ROW_OVERSCAN=20;
+            const tbody=document.getElementById("client-tbody"), rowEls=new Map();
+            function fragment(html){ const t=document.createElement("tbody"); t.innerHTML=html.trim(); return t.firstElementChild; }
+            const padTop=fragment('<tr class="vpad"><td colspan="8"></td></tr>'), padBottom=padTop.cloneNode(true);
+            tbody.append(padTop, padBottom);
+
+            function makeRow(addr){
+                const tr=fragment(`<tr class="client-row"><td class="caret-cell"><span class="caret">▼</span></td><td class="addr-cell"></td><td class="text-center"></td>
+                    <td class="td-num"></td><td class="td-num"></td><td class="td-num"></td><td class="td-num"></td><td class="last-cell"></td></tr>`);
+                tr.dataset.addr=addr; tr.cells[1].title=addr; tr.cells[1].textContent=iconForAddr(addr)+"\\u00a0 "+addr;
+                return {tr:tr, detail:null, fields:[], servers:null, host:"", row:null};
+            }
+            function patchRow(e, r){
+                const sev=severity(r), f=[sev, sevLabel(sev), r.NTP||"-", r.Drop||"-", r.Cmd||"-", r.Int||"-", humanSeen(r.Seen)];
+                const servers=(r.servers||[]).join(", "), open=isOpen(r.addr);
+                let changed=servers!==e.servers; e.row=r; e.servers=servers;
+                // Hostnames come from a background resolver and may show up in a later version.
+                const host=r.hostname||"";
+                if(host!==e.host){
+                    const cell=e.tr.cells[1]; cell.title=host?r.addr+" ("+host+")":r.addr;
+                    if(e.host) cell.lastChild.remove();
+                    if(host){ const h=document.createElement("span"); h.className="host"; h.textContent=host; cell.append(h); }
+                    e.host=host; changed=true;
+                }
+                if(f[0]!==e.fields[0]) e.tr.className="client-row sev-"+sev;
+                for(let i=1;i<f.length;i++) if(f[i]!==e.fields[i]){ e.tr.cells[i+1].textContent=f[i]; changed=true; }
+                e.fields=f;
+                const caret=e.tr.cells[0].firstChild, mark=open?"▲":"▼"; if(caret.textContent!==mark) caret.textContent=mark;
+                if(e.detail && (changed || !open)){ e.detail.remove(); e.detail=null; }
+                if(open && !e.detail){ e.detail=fragment(detailHTML(r)); if(!rates.has(r.addr)) loadRates(r.addr); }
+            }
+            // Keyed reconciliation: reuse, patch and move existing rows, create new ones, drop the rest.
+            function placeRows(rows){
+                const keep=new Set(); let ref=padTop.nextSibling;
+                for(const r of rows){
+                    let e=rowEls.get(r.addr); if(!e){ e=makeRow(r.addr); rowEls.set(r.addr,e); }
+                    patchRow(e,r); keep.add(r.addr);
+                    for(const n of (e.detail?[e.tr,e.detail]:[e.tr])){ if(n===ref) ref=ref.nextSibling; else tbody.insertBefore(n,ref); }
+                }
+                for(const [addr,e] of rowEls){ if(keep.has(addr)) continue; e.tr.remove(); if(e.detail) e.detail.remove(); rowEls.delete(addr); }
+            }
+
+            tbody.addEventListener("click", function(ev){
+                const tr=ev.target.closest("tr.client-row"); if(!tr || ev.target.closest("a,button,select,input,label")) return;
+                const addr=tr.dataset.addr, set=allOpen?closedSet:openSet;
+                keepAnchor(function(){
+                    if(set.has(addr)) set.delete(addr); else set.add(addr);
+                    measured.delete(addr); if(isOpen(addr)) rates.delete(addr);
+                    saveOpenSet(openSet);
+                });
+            });
+            el("expand-toggle").addEventListener("change", function(){
+                const on=this.checked;
+                keepAnchor(function(){
+                    allOpen=on; closedSet=new Set(); openSet=new Set(); measured.clear();
+                    saveOpenSet(openSet); try{ localStorage.setItem(ALL_KEY, on?"1":"0"); }catch(e){}
+                });
+            });
+            function updateExpandToggleVisual(){ el("expand-toggle").checked = allOpen && closedSet.size===0; }
+
+            // The server sends a window of FETCH_ROWS rows around the viewport (view.offset/limit);
+            // scrolling near its edge asks for the next window.
+            let cache=[], cacheOffset=0, total=0, version=null, viewKey="";
+            let view={q:"", sort:"ip_order", offset:0, limit:FETCH_ROWS};
+            function viewQuery(){ return new URLSearchParams(view).toString(); }
+
+            // Row heights: rendered rows are measured (an expanded row is several times taller), the
+            // others are estimated from rowH and detailH. tops[] is the prefix sum over the cached window.
+            let rowH=41, detailH=160, tops=[0];
+            const measured=new Map();
+            function rowHeight(addr){ const h=measured.get(addr); return h!==undefined ? h : rowH+(isOpen(addr)?detailH:0); }
+            function outsideHeight(){ return rowH+(allOpen?detailH:0); }
+            function layout(){ tops=[0]; let y=0; for(const r of cache){ y+=rowHeight(r.addr); tops.push(y); } }
+            function topOf(i){
+                const u=outsideHeight(), end=cacheOffset+cache.length;
+                if(i<=cacheOffset) return i*u;
+                if(i>=end) return cacheOffset*u+tops[cache.length]+(i-end)*u;
+                return cacheOffset*u+tops[i-cacheOffset];
+            }
+            function indexAt(y){
+                const u=outsideHeight(), base=cacheOffset*u, end=cacheOffset+cache.length;
+                if(y<base) return Math.max(0, Math.floor(y/u));
+                y-=base; if(y>=tops[cache.length]) return Math.min(total, end+Math.floor((y-tops[cache.length])/u));
+                let lo=0, hi=cache.length-1;
+                while(lo<hi){ const mid=(lo+hi+1)>>1; if(tops[mid]<=y) lo=mid; else hi=mid-1; }
+                return cacheOffset+lo;
+            }
+            function measure(rows){
+                let changed=false;
+                for(const r of rows){
+                    const e=rowEls.get(r.addr), h=e.tr.offsetHeight+(e.detail?e.detail.offsetHeight:0); if(!h) continue;
+                    if(e.detail) detailH=e.detail.offsetHeight; else rowH=h;
+                    if(measured.get(r.addr)!==h){ measured.set(r.addr,h); changed=true; }
+                }
+                return changed;
+            }
+            // Keeps the first visible row in place while the heights above it change.
+            function keepAnchor(change){
+                layout();
+                const top=-tbody.getBoundingClientRect().top, i=indexAt(Math.max(0,top)), within=top-topOf(i);
+                change(); renderWindow();
+                const d=topOf(i)+within-top; if(top>0 && Math.abs(d)>=1){ window.scrollBy(0,d); renderWindow(); }
+            }
+
+            let windowTimer=null;
+            function renderWindow(){
+                layout();
+                const top=Math.max(0, -tbody.getBoundingClientRect().top), end=cacheOffset+cache.length;
+                const seen=indexAt(top), seenEnd=Math.min(total, indexAt(top+window.innerHeight)+1);
+                const first=Math.max(0, seen-ROW_OVERSCAN), last=Math.min(total, seenEnd+ROW_OVERSCAN);
+                const from=Math.min(Math.max(first,cacheOffset),end), to=Math.max(Math.min(last,end),from);
+                const rows=cache.slice(from-cacheOffset, to-cacheOffset);
+                placeRows(rows);
+                if(measure(rows)) layout();
+                padTop.cells[0].style.height=topOf(from)+"px"; padBottom.cells[0].style.height=(topOf(total)-topOf(to))+"px";
+                updateExpandToggleVisual();
+                setText("page-info", total ? `${Math.min(seen+1,total)}–${seenEnd} of ${total}` : "0 of 0");
+                if(first<cacheOffset || (last>end && end<total)){
+                    const want=Math.max(0, Math.floor((first-(FETCH_ROWS-(last-first))/2)/WINDOW_STEP)*WINDOW_STEP);
+                    clearTimeout(windowTimer); if(want!==view.offset) windowTimer=setTimeout(()=>setView({offset:want}),100);
+                }
+            }
+            let frame=0;
+            function scheduleRender(){ if(!frame) frame=requestAnimationFrame(()=>{ frame=0; renderWindow(); }); }
+            window.addEventListener("scroll", scheduleRender, {passive:true});
+            window.addEventListener("resize", scheduleRender);
+
+            // Server clock, advanced locally between responses (304s carry no body).
+            let clockBase=null, clockAt=0;
+            function setClock(localTime){
+                const m=/^(\\d+)\\/(\\d+)\\/(\\d+), (\\d+):(\\d+):(\\d+)$/.exec(localTime||"");
+                if(!m) return; clockBase=Date.UTC(+m[3],+m[1]-1,+m[2],+m[4],+m[5],+m[6]); clockAt=Date.now();
+            }
+            // Ages grow between versions, so the visible ones are redrawn with the clock.
+            function tickSeen(){
+                for(const e of rowEls.values()){
+                    const t=humanSeen(e.row.Seen); if(t===e.fields[6]) continue;
+                    e.fields[6]=t; e.tr.cells[7].textContent=t;
+                    if(e.detail) e.detail.querySelector(".seen").textContent=t;
+                }
+            }
+            function tickClock(){
+                tickSeen(); if(clockBase===null) return; const t=new Date(clockBase+Date.now()-clockAt), p=n=>String(n).padStart(2,"0");
+                setText("date-part", `${p(t.getUTCMonth()+1)}/${p(t.getUTCDate())}/${t.getUTCFullYear()}`);
+                setText("time-part", `${p(t.getUTCHours())}:${p(t.getUTCMinutes())}:${p(t.getUTCSeconds())}`);
+            }
+
+            function handlePayload(payload){
+                // Ignore windows for a view the user has already left.
+                if(payload.q!==view.q || payload.sort!==view.sort || payload.offset!==view.offset) return;
+                if(payload.offset>0 && payload.offset>=payload.total){ setView({offset:Math.max(0,Math.floor((payload.total-FETCH_ROWS/2)/WINDOW_STEP)*WINDOW_STEP)}); return; }
+                if(payload.server_time) serverSkew=payload.server_time*1000-Date.now();
+                setClock(payload.local_time); tickClock();
+                setText("clients-count", payload.count||0); updateSummary(payload.severity||{});
+                keepAnchor(function(){
+                    cache=payload.clients_parsed||[]; cacheOffset=payload.offset; total=payload.total||0; version=payload.version;
+                    const inCache=new Set(cache.map(r=>r.addr)); for(const addr of measured.keys()) if(!inCache.has(addr)) measured.delete(addr);
+                });
+            }
+
+            function refresh(){
+                const key=viewQuery();
+                fetch("/data?"+key, {cache:"no-store", headers: (version && key===viewKey)?{"If-None-Match":`W/"${version}"`}:{}})
+                .then(r=>r.status===200?r.json():null).then(function(payload){ if(payload){ viewKey=key; handlePayload(payload); } }, ()=>{});
+            }
+
+            // Live updates are pushed over /stream; fall back to polling /data if it fails.
+            let stream=null, streamErrors=0, pollTimer=null;
+            function startPolling(){ if(!pollTimer){ refresh(); pollTimer=setInterval(refresh,1000); } }
+            function stopPolling(){ if(pollTimer){ clearInterval(pollTimer); pollTimer=null; } }
+            function startStream(){
+                if(!window.EventSource){ startPolling(); return; }
+                stream=new EventSource("/stream?"+viewQuery());
+                stream.addEventListener("page", function(e){ streamErrors=0; stopPolling(); handlePayload(JSON.parse(e.data)); });
+                stream.onerror=function(){
+                    if(++streamErrors<3) return;
+                    stream.close(); stream=null; streamErrors=0; startPolling(); setTimeout(startStream,60000);
+                };
+            }
+            function setView(changes){
+                Object.assign(view, changes); version=null;
+                if(stream){ stream.close(); startStream(); } else refresh();
+            }
+
+            let searchTimer=null;
+            function scrollToTable(){ const t=tbody.getBoundingClientRect().top; if(t<0) window.scrollBy(0,t); }
+            el("sort-select").addEventListener("change", function(){ scrollToTable(); setView({sort:this.value, offset:0}); });
+            el("search").addEventListener("input", function(){ clearTimeout(searchTimer); const q=this.value.trim().toLowerCase(); searchTimer=setTimeout(()=>{ scrollToTable(); setView({q:q, offset:0}); },200); });
+            startStream(); setInterval(tickClock,1000);
+"""
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+    <html lang="en" data-theme="dark">
+    <head>
+        <meta charset="UTF-8"/>
+        <meta name="viewport" content="width=device-width, initial-scale=1"/>
+        <title>TICC-DASH | Time Information of Chrony Clients – Dashboard</title>
+
+        <link rel="icon" type="image/png" href="{logo}"/>
+        <link rel="stylesheet" href="{css}"/>
+        <script>document.documentElement.dataset.theme=localStorage.getItem("ticc_dash_theme")||"dark";</script>
+        <script defer src="{js}"></script>
     </head>
     <body>
         <!-- Toolbar -->
@@ -239,7 +2894,7 @@ def dashboard():
         <div class="page">
             <!-- Brand header (logo + title remain centered together) -->
             <div class="brand-wrap">
-                <img class="brand-logo" src="/static/img/ticc-dash-logo.png" alt="TICC-DASH Logo" />
+                <img class="brand-logo" src="{logo}" alt="TICC-DASH Logo" />
                 <div class="title">TICC-DASH</div>
             </div>
             <div class="subtitle">Time Information of Chrony Clients – Dashboard</div>
@@ -252,7 +2907,7 @@ def dashboard():
 
             <div style="height:14px"></div>
             <div class="subinfo">
-                <span class="badge bg-primary badge-clients">Clients: <span id="clients-count">0</span></span>
+                <span class="badge badge-clients">Clients: <span id="clients-count">0</span></span>
             </div>
 
             <div class="summary-bar">
@@ -266,12 +2921,13 @@ def dashboard():
                     <option value="ip_order">Sort by: IP Address (IPv4 numeric, then others)</option>
                     <option value="drop_desc">Sort by: Drop Count (high → low)</option>
                     <option value="last_recent">Sort by: Last Seen (recent → old)</option>
+                    <option value="severity">Sort by: Status (critical first)</option>
                 </select>
-                <input id="search" type="text" class="form-control" placeholder="Search clients..."/>
+                <input id="search" type="text" class="form-control" placeholder="Search addresses or hostnames..."/>
             </div>
 
             <div class="table-wrap">
-                <table class="table table-hover align-middle client-table">
+                <table class="table client-table">
                     <colgroup>
                         <col style="width:32px" />
                         <col />
@@ -297,121 +2953,482 @@ def dashboard():
                     <tbody id="client-tbody"></tbody>
                 </table>
             </div>
+            <div class="pager"><span id="page-info">0 of 0</span></div>
         </div>
 
-        <script>
-            function applyTheme(theme){
-                $("html").attr("data-bs-theme", theme);
-                $("#theme-toggle").prop("checked", theme === "dark");
-            }
-            const THEME_KEY="ticc_dash_theme", OPEN_KEY="ticc_dash_open_rows";
-            const savedTheme=localStorage.getItem(THEME_KEY)||"dark"; applyTheme(savedTheme);
-            $("#theme-toggle").on("change", function(){ const t=this.checked?"dark":"light"; localStorage.setItem(THEME_KEY,t); applyTheme(t); });
+    </body>
+    </html>
+"""
 
-            const infoBtn=document.getElementById("infoBtn"), infoPop=document.getElementById("infoPop");
-            infoBtn.addEventListener("click",(e)=>{e.stopPropagation(); infoPop.style.display = infoPop.style.display==="block"?"none":"block";});
-            document.addEventListener("click",(e)=>{ if(!infoPop.contains(e.target) && e.target!==infoBtn){ infoPop.style.display="none"; } });
 
-            function toInt(v){ const n=parseInt(v,10); return isNaN(n)?0:n; }
-            function lastToSeconds(raw){
-                if(!raw) return null; const s=String(raw).trim().toLowerCase();
-                if (s==="-"||s==="?"||s==="") return null;
-                if (/^\\d+$/.test(s)) return parseInt(s,10);
-                const m=s.match(/^(\\d+(?:\\.\\d+)?)\\s*([a-z]+)$/i); if(!m) return null;
-                const num=parseFloat(m[1]), unit=m[2];
-                if(["s","sec","secs","second","seconds"].includes(unit)) return num;
-                if(["m","min","mins","minute","minutes"].includes(unit)) return num*60;
-                if(["h","hr","hrs","hour","hours"].includes(unit)) return num*3600;
-                if(["d","day","days"].includes(unit)) return num*86400;
-                return null;
-            }
-            function humanLast(raw){ const sec=lastToSeconds(raw); if(sec===null) return raw||"-"; if(sec<60) return Math.floor(sec)+" sec ago"; const m=Math.floor(sec/60); if(m<60) return m+" min ago"; const h=Math.floor(m/60); if(h<24) return h+" hr ago"; return Math.floor(h/24)+" d ago"; }
-            function severity(r){ const d=toInt(r.Drop); if(d>=10) return 2; if(d>0) return 1; return 0; }
-            function sevLabel(s){ return s===2?"Critical":(s===1?"Warning":"OK"); }
-            function iconForAddr(a){ if(/^\\d+\\.\\d+\\.\\d+\\.\\d+$/.test(a)) return "🌐"; if(/^[0-9a-fA-F:]+$/.test(a)) return "🔗"; return "💻"; }
+def _squeeze(text):
+    """Drop indentation and blank lines from the inline page sources."""
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
 
-            function loadOpenSet(){ try{ return new Set(JSON.parse(localStorage.getItem(OPEN_KEY)||"[]")); }catch(e){ return new Set(); } }
-            function saveOpenSet(s){ try{ localStorage.setItem(OPEN_KEY, JSON.stringify([...s])); }catch(e){} }
-            let openSet=loadOpenSet();
-
-            function ipTuple(a){ if(!/^\\d+\\.\\d+\\.\\d+\\.\\d+$/.test(a)) return null; return a.split(".").map(n=>parseInt(n,10)); }
-            function sortRows(rows, mode){
-                if(mode==="ip_order"){
-                    rows.sort((a,b)=>{ const A=ipTuple(a.addr||""),B=ipTuple(b.addr||""); if(A&&B){ for(let i=0;i<4;i++){ if(A[i]!=B[i]) return A[i]-B[i]; } return 0; } if(A&&!B) return -1; if(!A&&B) return 1; return (a.addr||"").toLowerCase().localeCompare((b.addr||"").toLowerCase()); });
-                } else if(mode==="drop_desc"){ rows.sort((a,b)=> toInt(b.Drop)-toInt(a.Drop)); }
-                else if(mode==="last_recent"){ rows.sort((a,b)=>{ const as=lastToSeconds(a.Last), bs=lastToSeconds(b.Last); if(as===null&&bs===null) return 0; if(as===null) return 1; if(bs===null) return -1; return as-bs; }); }
-                return rows;
-            }
 
-            function updateSummary(rows){ let ok=0,w=0,b=0; rows.forEach(r=>{ const s=severity(r); if(s===0) ok++; else if(s===1) w++; else b++; }); $("#count-ok").text(ok); $("#count-warn").text(w); $("#count-bad").text(b); }
+class Asset:
+    """A static response built once, with its compressed variants.
 
-            function detailHTML(r){ return `
-                <tr class="detail-row" data-detail-for="${r.addr}"><td></td><td colspan="7">
-                    <div class="metrics">
-                        <div class="metric"><div class="label">🕙 NTP Packets</div><div class="value">${r.NTP||"-"}</div></div>
-                        <div class="metric"><div class="label">📉 Dropped Packets</div><div class="value">${r.Drop||"-"}</div></div>
-                        <div class="metric"><div class="label">📨 Command Packets</div><div class="value">${r.Cmd||"-"}</div></div>
-                        <div class="metric"><div class="label">🔄 Interval</div><div class="value">${r.Int||"-"}</div></div>
-                        <div class="metric"><div class="label">👁️ Last Seen</div><div class="value">${humanLast(r.Last)}</div></div>
-                    </div>
-                </td></tr>`; }
-            function rowHTML(r){ const sev=severity(r), addr=r.addr||"", open=openSet.has(addr), caret=open?"▲":"▼"; return `
-                <tr class="client-row sev-${sev}" data-addr="${addr}">
-                    <td class="caret-cell"><span class="caret">${caret}</span></td>
-                    <td class="addr-cell" title="${addr}">${iconForAddr(addr)}&nbsp; ${addr}</td>
-                    <td class="text-center">${sevLabel(sev)}</td>
-                    <td class="td-num">${r.NTP||"-"}</td><td class="td-num">${r.Drop||"-"}</td><td class="td-num">${r.Cmd||"-"}</td><td class="td-num">${r.Int||"-"}</td>
-                    <td class="last-cell">${humanLast(r.Last)}</td>
-                </tr>${open?detailHTML(r):""}`; }
-
-            function updateExpandToggleVisual(){ const total=$("#client-tbody .client-row").length; const openCnt=openSet.size; $("#expand-toggle").prop("checked", total>0 && openCnt===total); }
-
-            function bindHandlers(){
-                $("#client-tbody .client-row").off("click").on("click", function(e){
-                    if($(e.target).closest("a,button,select,input,label").length) return;
-                    const $row=$(this), addr=$row.data("addr"), isOpen=openSet.has(addr);
-                    if(isOpen){ $row.find(".caret").text("▼"); $(`tr.detail-row[data-detail-for="${addr}"]`).remove(); openSet.delete(addr); }
-                    else { $row.find(".caret").text("▲"); $(detailHTML(cache.find(r=>r.addr===addr))).insertAfter($row); openSet.add(addr); }
-                    saveOpenSet(openSet); updateExpandToggleVisual();
-                });
+    The name carries a hash of the content. Each encoding gets its own
+    strong ETag so caches never hand out the wrong variant.
+    """
 
-                $("#expand-toggle").off("change").on("change", function(){
-                    if(this.checked){
-                        $("#client-tbody .client-row").each(function(){ const $r=$(this), a=$r.data("addr"); if(!openSet.has(a)){ $r.find(".caret").text("▲"); $(detailHTML(cache.find(r=>r.addr===a))).insertAfter($r); openSet.add(a); }});
-                    }else{
-                        $("#client-tbody .client-row .caret").text("▼"); $("#client-tbody tr.detail-row").remove(); openSet=new Set();
-                    }
-                    saveOpenSet(openSet); updateExpandToggleVisual();
-                });
-            }
+    def __init__(self, name, body, mimetype, cache_control):
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.name = f"{stem}.{self.digest}{ext}"
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.variants = {"identity": body}
+        if mimetype.startswith("text/"):
+            encoded = {"gzip": gzip.compress(body, 9, mtime=0)}
+            if brotli is not None:
+                encoded["br"] = brotli.compress(body, quality=11)
+            for encoding, data in encoded.items():
+                if len(data) < len(body):
+                    self.variants[encoding] = data
 
-            let cache=[], lastHash="";
-            function computeHash(rows){ return rows.map(r=>[r.addr,r.NTP,r.Drop,r.Int,r.Last,r.Cmd].join("|")).join("~"); }
+    def response(self):
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if (
+                candidate in self.variants
+                and request.accept_encodings.quality(candidate) > 0
+            ):
+                encoding = candidate
+                break
+        etag = self.digest if encoding == "identity" else f"{self.digest}-{encoding}"
+        if request.if_none_match.contains(etag):
+            resp = app.response_class(status=304)
+        else:
+            resp = app.response_class(self.variants[encoding], mimetype=self.mimetype)
+            if encoding != "identity":
+                resp.headers["Content-Encoding"] = encoding
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = self.cache_control
+        resp.vary.add("Accept-Encoding")
+        return resp
 
-            function render(){
-                const q=$("#search").val().trim().toLowerCase(), mode=$("#sort-select").val();
-                let rows=cache.filter(r=> !q || JSON.stringify(r).toLowerCase().includes(q));
-                rows=sortRows(rows,mode); updateSummary(rows);
-                $("#client-tbody").html(rows.map(rowHTML).join("")); bindHandlers(); updateExpandToggleVisual();
-            }
 
-            function refresh(){
-                $.getJSON("/data", function(payload){
-                    const y=window.scrollY;
-                    const [d,t]=(payload.local_time||"").split(", "); $("#date-part").text(d||"--"); $("#time-part").text(t||"--");
-                    $("#clients-count").text(payload.count||0);
-                    const rows=payload.clients_parsed||[], h=computeHash(rows);
-                    if(h!==lastHash){ cache=rows; render(); lastHash=h; } else { updateSummary(cache); }
-                    if(window.scrollY!==y) window.scrollTo(0,y);
-                });
-            }
-            $(function(){ $("#sort-select").on("change",render); $("#search").on("input",render); refresh(); setInterval(refresh,1000); });
-        </script>
-    </body>
-    </html>
+def build_assets():
+    """Build the dashboard page and the content-hashed assets it links to."""
+    assets = {}
+
+    def add(name, body, mimetype):
+        asset = Asset(name, body, mimetype, "public, max-age=31536000, immutable")
+        assets[asset.name] = asset
+        return f"/assets/{asset.name}"
+
+    urls = {
+        "css": add("ticc-dash.css", _squeeze(DASHBOARD_CSS).encode(), "text/css"),
+        "js": add("ticc-dash.js", _squeeze(DASHBOARD_JS).encode(), "text/javascript"),
+        "logo": "/static/img/ticc-dash-logo.png",
+    }
+    logo = os.path.join(app.static_folder, "img", "ticc-dash-logo.png")
+    if os.path.exists(logo):
+        with open(logo, "rb") as f:
+            urls["logo"] = add("ticc-dash-logo.png", f.read(), "image/png")
+    html = _squeeze(DASHBOARD_HTML.format(**urls)).encode()
+    return Asset("index.html", html, "text/html", "no-cache"), assets
+
+
+page, assets = build_assets()
+
+
+@app.route("/assets/<name>")
+def asset(name):
+    found = assets.get(name)
+    if found is None:
+        abort(404)
+    return found.response()
+
+
+@app.route("/")
+def dashboard():
+    return page.response()
+
+
+def _wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ):
+    """Run the Flask app on one request; return ``(status, headers, body)``.
+
+    A response without a Content-Length (an export) is streamed: its body is
+    the WSGI iterable, which the caller reads chunk by chunk and closes.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    result = app(environ, start_response)
+    status, headers = started
+    if not status.startswith(("204", "304")) and not any(
+        k.lower() == "content-length" for k, _ in headers
+    ):
+        return status, headers, result
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return status, headers, body
+
+
+async def _asgi_start(send, status, headers):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": int(str(status).split()[0]),
+            "headers": [
+                (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers
+            ],
+        }
+    )
+
+
+async def _asgi_respond(send, status, headers, body):
+    await _asgi_start(send, status, headers)
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _asgi_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _asgi_wsgi(scope, receive, send, inline=False):
+    environ = _wsgi_environ(scope, await _asgi_body(receive))
+    if inline:
+        status, headers, body = _call_wsgi(environ)
+    else:
+        status, headers, body = await asyncio.to_thread(_call_wsgi, environ)
+    if isinstance(body, bytes):
+        await _asgi_respond(send, status, headers, body)
+        return
+    # Each chunk is produced in a worker thread and sent as soon as it is ready.
+    chunks = iter(body)
+    try:
+        await _asgi_start(send, status, headers)
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+
+async def _until_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _asgi_stream(scope, receive, send):
+    query = scope["query_string"].decode("latin-1")
+    args = MultiDict(urllib.parse.parse_qsl(query, keep_blank_values=True))
+    try:
+        view = _parse_view(args)
+    except ValueError as e:
+        headers = [("Content-Type", "application/json")]
+        await _asgi_respond(send, 400, headers, _dumps({"error": str(e)}))
+        return
+    headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+    since = headers.get("last-event-id") or args.get("since")
+    snap = await collector.aget()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+    gone = asyncio.ensure_future(_until_disconnect(receive))
+    try:
+        chunk, last = "retry: 3000\n\n", None
+        while True:
+            if _sse_cached(snap, view, since):
+                event, since, last = _sse_next(snap, view, since, last)
+            else:
+                # The first viewer of a version builds its event off the loop.
+                event, since, last = await asyncio.to_thread(
+                    _sse_next, snap, view, since, last
+                )
+            if chunk or event:
+                body = (chunk + event).encode()
+                await send(
+                    {"type": "http.response.body", "body": body, "more_body": True}
+                )
+            change = asyncio.ensure_future(
+                collector.await_change(since, STREAM_HEARTBEAT)
+            )
+            await asyncio.wait((change, gone), return_when=asyncio.FIRST_COMPLETED)
+            if gone.done():
+                change.cancel()
+                return
+            snap = change.result()
+            chunk = ": keepalive\n\n" if snap.tag == since else ""
+    finally:
+        gone.cancel()
+
+
+async def _asgi_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            collector.start_async()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            collector.stop_async()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def _data_cached(scope):
+    """Whether the current snapshot already holds every encoding a ``/data``
+    request needs, so that answering it on the event loop is cheap."""
+    req = Request(_wsgi_environ(scope, b""))
+    try:
+        view = _parse_view(req.args)
+        fmt = _parse_format(req.args, req.accept_mimetypes)
+    except ValueError:
+        return True
+    snap = collector.snapshot
+    if req.if_none_match.contains_weak(snap.tag):
+        return True
+    since = _data_since(req.args.get("since"), view)
+    body = snap.peek(("data", since, view, fmt))
+    if body is None:
+        return False
+    if len(body) < GZIP_MIN_SIZE or req.accept_encodings.quality("gzip") <= 0:
+        return True
+    return snap.peek(("data.deflate", since, view, fmt)) is not None
+
+
+async def asgi_app(scope, receive, send):
+    """ASGI entry point (``ticc-dash:asgi_app``).
+
+    ``/stream`` runs on the event loop, so an idle viewer costs a socket and
+    a waiting task rather than a thread. Requests to ``/data`` whose
+    encodings are cached run on the loop as well; building them for a new
+    version (like a stream's first event for it) runs in a thread. Other
+    routes go to the Flask app in a worker thread; streamed responses
+    (``/export``) are produced there chunk by chunk. Collections run as a
+    task on the same loop.
+    """
+    if scope["type"] == "lifespan":
+        await _asgi_lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    # Also without lifespan events, so that Flask routes never start a thread.
+    collector.start_async()
+    if scope["path"] == "/stream":
+        await _asgi_stream(scope, receive, send)
+    elif scope["path"] == "/data":
+        await collector.aget()
+        # The first request for a version builds its encodings in a thread.
+        await _asgi_wsgi(scope, receive, send, inline=_data_cached(scope))
+    else:
+        await _asgi_wsgi(scope, receive, send)
+
+
+async def _serve_connection(reader, writer):
+    """One connection of the built-in HTTP/1.1 server.
+
+    A fallback for development when uvicorn is not installed. Keeps
+    connections alive, sends responses without a Content-Length (the event
+    stream, exports) chunked, sends HEAD, 1xx, 204 and 304 responses without
+    framing or body, and does not pipeline requests.
     """
-    return render_template_string(html)
+    peer = writer.get_extra_info("peername") or ("", 0)
+    local = writer.get_extra_info("sockname") or ("", 0)
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ")
+            except ValueError:
+                return
+            headers = []
+            for line in lines[1:]:
+                if line:
+                    name, _, value = line.partition(":")
+                    headers.append(
+                        (
+                            name.strip().lower().encode("latin-1"),
+                            value.strip().encode("latin-1"),
+                        )
+                    )
+            fields = dict(headers)
+            length = int(fields.get(b"content-length") or 0)
+            body = await reader.readexactly(length) if length else b""
+            path, _, query = target.partition("?")
+            keep_alive = (
+                version == "HTTP/1.1"
+                and fields.get(b"connection", b"").lower() != b"close"
+            )
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": version[5:],
+                "method": method,
+                "scheme": "http",
+                "path": urllib.parse.unquote(path),
+                "raw_path": path.encode("latin-1"),
+                "query_string": query.encode("latin-1"),
+                "root_path": "",
+                "headers": headers,
+                "client": tuple(peer[:2]),
+                "server": tuple(local[:2]),
+            }
+            state = {"received": False, "started": False, "chunked": False}
+
+            async def receive():
+                if not state["received"]:
+                    state["received"] = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                # After the body the only event left is the client going away.
+                while await reader.read(65536):
+                    pass
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    out = [
+                        (k.decode("latin-1"), v.decode("latin-1"))
+                        for k, v in message.get("headers", ())
+                    ]
+                    # These end at the blank line: no framing, no body.
+                    state["bodiless"] = (
+                        method == "HEAD" or status < 200 or status in (204, 304)
+                    )
+                    framed = any(k.lower() == "content-length" for k, _ in out)
+                    if not framed and not state["bodiless"]:
+                        if version == "HTTP/1.1":
+                            state["chunked"] = True
+                            out.append(("Transfer-Encoding", "chunked"))
+                        else:
+                            state["close"] = True
+                    if not keep_alive:
+                        out.append(("Connection", "close"))
+                    try:
+                        reason = http.HTTPStatus(status).phrase
+                    except ValueError:
+                        reason = ""
+                    lines = [f"HTTP/1.1 {status} {reason}"]
+                    lines += [f"{k}: {v}" for k, v in out]
+                    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+                    state["started"] = True
+                elif message["type"] == "http.response.body":
+                    data = message.get("body", b"")
+                    more = message.get("more_body", False)
+                    if state["bodiless"]:
+                        pass
+                    elif state["chunked"]:
+                        if data:
+                            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        if not more:
+                            writer.write(b"0\r\n\r\n")
+                    else:
+                        writer.write(data)
+                    await writer.drain()
+
+            try:
+                await asgi_app(scope, receive, send)
+            except Exception:
+                app.logger.exception("error serving %s %s", method, target)
+                if not state["started"]:
+                    await _asgi_respond(send, 500, [("Content-Length", "0")], b"")
+                return
+            if not keep_alive or state.get("close"):
+                return
+    except ConnectionError:
+        return
+    finally:
+        writer.close()
+
+
+async def _serve(host, port):
+    server = await asyncio.start_server(_serve_connection, host, port, backlog=1024)
+    collector.start_async()
+    app.logger.warning(
+        "serving on http://%s:%d/ (built-in asyncio server, for development;"
+        " install uvicorn for production)",
+        host,
+        port,
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def serve_asgi(host="0.0.0.0", port=5000):
+    """Serve ``asgi_app`` with uvicorn if installed, else the built-in server."""
+    if uvicorn is not None:
+        uvicorn.run(asgi_app, host=host, port=port)
+    else:
+        asyncio.run(_serve(host, port))
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    parser = argparse.ArgumentParser(description="TICC-DASH dashboard server")
+    parser.add_argument(
+        "--asgi",
+        action="store_true",
+        help="serve with asyncio (uvicorn if installed) instead of the Flask dev server",
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    if args.asgi:
+        serve_asgi(args.host, args.port)
+    else:
+        app.run(host=args.host, port=args.port, debug=True)
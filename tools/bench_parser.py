@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Synthetic chronyc output generator and parser throughput benchmark.
+
+    python3 tools/bench_parser.py --clients 100000
+    python3 tools/bench_parser.py --clients 100000 --min-rate 500000
+    python3 tools/bench_parser.py --clients 5000 --emit csv > clients.csv
+
+``--emit`` writes ``chronyc -c -n clients`` (csv) or ``chronyc clients``
+(text) output instead of benchmarking. ``--min-rate`` makes the run fail when
+the CSV pipeline parses fewer lines per second than given, so a slowdown shows
+up before deploy.
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_chronyd import make_clients  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location(
+        "ticc_dash", os.path.join(ROOT, "ticc-dash.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def emit_csv(clients):
+    return "".join(
+        f"{addr},{ntp},{drops},{interval},4,{last},0,0,-,4294967295\n"
+        for addr, ntp, drops, interval, last in clients
+    )
+
+
+def emit_text(clients, td):
+    lines = [
+        "Hostname                      NTP   Drop Int IntL Last     Cmd   Drop Int  Last",
+        "=" * 81,
+    ]
+    for addr, ntp, drops, interval, last in clients:
+        lines.append(
+            f"{str(addr):<25}  {ntp:6d}  {drops:5d}  {interval:3d}   4  "
+            f"{td._format_seconds(last):>4}       0      0   -     -"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def legacy_text_pipeline(output):
+    # The original `chronyc clients` parser, kept here as a baseline.
+    import socket
+
+    def is_family(family, addr):
+        try:
+            socket.inet_pton(family, addr)
+            return True
+        except OSError:
+            return False
+
+    lines = output.strip().split("\n")
+    body = [ln.rstrip() for ln in lines[2:] if ln.strip() != ""]
+    hostnames, ipv4s, ipv6s = [], [], []
+    for ln in body:
+        addr = (ln.split() or [""])[0]
+        if is_family(socket.AF_INET, addr):
+            ipv4s.append(ln)
+        elif is_family(socket.AF_INET6, addr):
+            ipv6s.append(ln)
+        else:
+            hostnames.append(ln)
+    hostnames.sort(key=lambda x: x.split()[0].lower())
+    ipv4s.sort(key=lambda x: tuple(map(int, (x.split()[0]).split("."))))
+    ipv6s.sort(key=lambda x: x.split()[0])
+    parsed = []
+    for ln in hostnames + ipv4s + ipv6s:
+        parts = ln.split()
+        f = parts[1:]
+        parsed.append(
+            {
+                "addr": parts[0],
+                "NTP": f[0],
+                "Drop": f[1],
+                "Int": f[2],
+                "IntL": f[3],
+                "Last": f[4],
+                "Cmd": f[5],
+            }
+        )
+    return parsed
+
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--clients", type=int, default=100000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--emit", choices=("csv", "text"))
+    ap.add_argument("--min-rate", type=float, default=0.0, help="lines/s")
+    args = ap.parse_args()
+
+    td = load_app()
+    clients = make_clients(args.clients, args.seed)
+    if args.emit == "csv":
+        sys.stdout.write(emit_csv(clients))
+        return 0
+    if args.emit == "text":
+        sys.stdout.write(emit_text(clients, td))
+        return 0
+
+    csv_out = emit_csv(clients)
+    text_out = emit_text(clients, td)
+
+    def csv_pipeline(output):
+        records = td.parse_chronyc_csv(output)
+        records.sort(key=lambda r: r.sort_key)
+        return records
+
+    n = args.clients
+    results = [
+        ("csv parse", best_of(td.parse_chronyc_csv, csv_out, args.repeat)),
+        ("csv parse+sort", best_of(csv_pipeline, csv_out, args.repeat)),
+        (
+            "legacy text parse+sort",
+            best_of(legacy_text_pipeline, text_out, args.repeat),
+        ),
+    ]
+    for name, secs in results:
+        print(f"{name:<24} {secs * 1000:9.1f} ms  {n / secs:12,.0f} lines/s")
+    rate = n / results[1][1]
+    if args.min_rate and rate < args.min_rate:
+        print(f"FAIL: {rate:,.0f} lines/s < {args.min_rate:,.0f}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Fake chronyd command socket for developing and testing TICC-DASH.
+
+Answers CLIENT_ACCESSES_BY_INDEX3 requests from a synthetic client table on a
+Unix datagram socket or on UDP, the same way chronyd does:
+
+    python3 tools/fake_chronyd.py --socket /tmp/chronyd.sock --clients 5000
+    TICC_DASH_SOURCE=socket TICC_DASH_CHRONY_SOCKET=/tmp/chronyd.sock \\
+        python3 ticc-dash.py
+
+It can also be used in-process:
+
+    with FakeChronyd(path="/tmp/chronyd.sock", clients=make_clients(100)):
+        ...
+"""
+
+import argparse
+import ipaddress
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+PROTO_VERSION = 6
+PKT_TYPE_CMD_REQUEST = 1
+PKT_TYPE_CMD_REPLY = 2
+REQ_CLIENT_ACCESSES_BY_INDEX3 = 68
+RPY_NULL = 1
+RPY_CLIENT_ACCESSES_BY_INDEX3 = 21
+MAX_CLIENT_ACCESSES = 8
+STT_SUCCESS = 0
+STT_INVALID = 3
+STT_BADPKTLENGTH = 19
+
+REQ_HEADER = struct.Struct("!BBBBHHIII")
+REQ_CLIENT_ACCESSES = struct.Struct("!IIIIi")
+RPY_HEADER = struct.Struct("!BBBBHHHHHHIII")
+RPY_CLIENT_ACCESSES = struct.Struct("!III")
+RPY_CLIENT_ACCESS = struct.Struct("!16sH2xIIIIIIbbbbIII")
+REPLY_LEN = (
+    RPY_HEADER.size
+    + RPY_CLIENT_ACCESSES.size
+    + MAX_CLIENT_ACCESSES * RPY_CLIENT_ACCESS.size
+    + 4
+)
+
+
+def make_clients(n, seed=0):
+    """Return ``n`` synthetic client tuples, mixing IPv4 and IPv6 addresses."""
+    rnd = random.Random(seed)
+    clients = []
+    for i in range(n):
+        if i % 5 == 4:
+            addr = ipaddress.IPv6Address(0x20010DB8 << 96 | rnd.getrandbits(64))
+        else:
+            addr = ipaddress.IPv4Address(0x0A000000 | rnd.getrandbits(24))
+        ntp = rnd.randint(0, 100000)
+        drops = rnd.choice((0, 0, 0, 0, rnd.randint(1, 9), rnd.randint(10, 500)))
+        last = rnd.choice((rnd.randint(0, 1199), rnd.randint(1200, 400000)))
+        clients.append((addr, ntp, drops, rnd.randint(-2, 10), last))
+    return clients
+
+
+def _pack_client(addr, ntp, drops, interval, last, elapsed=0):
+    if addr.version == 4:
+        raw, family = addr.packed + bytes(12), 1
+    else:
+        raw, family = addr.packed, 2
+    return RPY_CLIENT_ACCESS.pack(
+        raw,
+        family,
+        ntp,
+        0,
+        0,
+        drops,
+        0,
+        0,
+        interval,
+        -128,
+        -128,
+        4,
+        last + elapsed,
+        0xFFFFFFFF,
+        0xFFFFFFFF,
+    )
+
+
+class FakeChronyd:
+    def __init__(self, path=None, host="127.0.0.1", port=0, clients=()):
+        self.path = path
+        self.clients = list(clients)
+        if path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            if os.path.exists(path):
+                os.unlink(path)
+            self.sock.bind(path)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self.requests = 0
+        # Like chronyd, report last-hit ages that grow while nothing happens.
+        self.started = time.monotonic()
+        self._thread = None
+
+    def reply(self, packet):
+        if len(packet) < REQ_HEADER.size:
+            return None
+        version, pkt_type, _, _, command, _, seq, _, _ = REQ_HEADER.unpack_from(packet)
+        if pkt_type != PKT_TYPE_CMD_REQUEST:
+            return None
+        self.requests += 1
+        status, body, rpy = STT_SUCCESS, b"", RPY_NULL
+        if command != REQ_CLIENT_ACCESSES_BY_INDEX3:
+            status = STT_INVALID
+        elif len(packet) < REPLY_LEN:
+            status = STT_BADPKTLENGTH
+        else:
+            first, count, _, _, _ = REQ_CLIENT_ACCESSES.unpack_from(
+                packet, REQ_HEADER.size
+            )
+            count = min(count, MAX_CLIENT_ACCESSES)
+            page = self.clients[first : first + count]
+            body = RPY_CLIENT_ACCESSES.pack(
+                len(self.clients), first + len(page), len(page)
+            )
+            elapsed = int(time.monotonic() - self.started)
+            body += b"".join(_pack_client(*c, elapsed) for c in page)
+            body += bytes(REPLY_LEN - RPY_HEADER.size - len(body))
+            rpy = RPY_CLIENT_ACCESSES_BY_INDEX3
+        head = RPY_HEADER.pack(
+            version,
+            PKT_TYPE_CMD_REPLY,
+            0,
+            0,
+            command,
+            rpy,
+            status,
+            0,
+            0,
+            0,
+            seq,
+            0,
+            0,
+        )
+        return head + body
+
+    def serve_forever(self):
+        while True:
+            try:
+                packet, peer = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            out = self.reply(packet)
+            if out is not None and peer:
+                self.sock.sendto(out, peer)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.sock.close()
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--socket", help="Unix socket path to listen on")
+    ap.add_argument("--udp", default="127.0.0.1:3230", help="host:port (UDP)")
+    ap.add_argument("--clients", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    host, _, port = args.udp.rpartition(":")
+    server = FakeChronyd(
+        path=args.socket,
+        host=host,
+        port=int(port),
+        clients=make_clients(args.clients, args.seed),
+    )
+    print(f"fake chronyd on {server.address} with {len(server.clients)} clients")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.__exit__()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Concurrent-viewer load test for a running TICC-DASH server.
+
+Each viewer holds one keep-alive connection and requests ``/data`` in a
+loop, the way a polling dashboard does. Latency percentiles are reported per
+concurrency level:
+
+    python3 tools/fake_chronyd.py --socket /tmp/chronyd.sock --clients 20000 &
+    TICC_DASH_SOURCE=socket TICC_DASH_CHRONY_SOCKET=/tmp/chronyd.sock \\
+        python3 ticc-dash.py --asgi --port 5000 &
+    python3 tools/loadtest.py --url http://127.0.0.1:5000/data?limit=200
+
+``--viewers`` takes a comma-separated list of levels (default 1,100,1000).
+``--max-p99`` makes the run fail when any level's p99 exceeds it, in ms.
+"""
+
+import argparse
+import asyncio
+import resource
+import sys
+import time
+import urllib.parse
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def viewer(url, deadline, latencies, errors, started):
+    parts = urllib.parse.urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    request = (
+        f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        "Accept-Encoding: gzip\r\n\r\n"
+    ).encode()
+    await started.wait()
+    writer = None
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(
+                    parts.hostname, parts.port or 80
+                )
+            writer.write(request)
+            status = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append(time.perf_counter() - t0)
+            if writer is not None:
+                writer.close()
+                writer = None
+            await asyncio.sleep(0.05)
+            continue
+        if status == 200:
+            latencies.append(time.perf_counter() - t0)
+        else:
+            errors.append(time.perf_counter() - t0)
+    if writer is not None:
+        writer.close()
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_level(url, viewers, duration):
+    latencies, errors = [], []
+    started = asyncio.Event()
+    deadline = time.monotonic() + duration
+    tasks = [
+        asyncio.create_task(viewer(url, deadline, latencies, errors, started))
+        for _ in range(viewers)
+    ]
+    started.set()
+    t0 = time.monotonic()
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - t0
+    return latencies, errors, elapsed
+
+
+def raise_fd_limit(viewers):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = viewers + 64
+    if soft < want:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(want, hard), hard))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default="http://127.0.0.1:5000/data")
+    ap.add_argument("--viewers", default="1,100,1000")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    ap.add_argument("--max-p99", type=float, default=0.0, help="ms")
+    args = ap.parse_args()
+
+    levels = [int(v) for v in args.viewers.split(",")]
+    raise_fd_limit(max(levels))
+    print(
+        f"{'viewers':>7} {'requests':>9} {'errors':>7} {'req/s':>9} "
+        f"{'p50 ms':>9} {'p99 ms':>9}"
+    )
+    failed = False
+    for n in levels:
+        latencies, errors, elapsed = asyncio.run(run_level(args.url, n, args.duration))
+        p50 = percentile(latencies, 50) * 1000
+        p99 = percentile(latencies, 99) * 1000
+        print(
+            f"{n:>7} {len(latencies):>9} {len(errors):>7} "
+            f"{len(latencies) / elapsed:>9.0f} {p50:>9.1f} {p99:>9.1f}"
+        )
+        if args.max_p99 and not p99 <= args.max_p99:
+            failed = True
+    if failed:
+        print(f"FAIL: p99 above {args.max_p99:g} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())